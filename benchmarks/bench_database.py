@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for every database.py function at several dataset sizes.
+Each size is a generated semester (benchmarks/generate_dataset.py), cached
+in --data-dir and copied before each run so writes never leak between runs.
+Median call times are compared against a stored baseline and the run fails
+when a function is slower than baseline * (1 + tolerance).
+
+Usage:
+    python benchmarks/bench_database.py [--sizes 10000,1000000] [--data-dir .bench-data]
+    python benchmarks/bench_database.py --sizes 10000,1000000,10000000 --save-baseline
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import GENERATOR_VERSION, generate  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "database.json")
+
+
+def forget_database():
+    """Drops the imported database module so the next import rebinds DB_FILE."""
+    for name in ("ratemyrations.database", "ratemyrations"):
+        sys.modules.pop(name, None)
+
+
+def load_database(db_file):
+    """Imports a fresh ratemyrations.database bound to db_file."""
+    os.environ["RATINGS_DB_FILE"] = db_file
+    os.environ.setdefault("ADMIN_TOKEN", "bench")
+    forget_database()
+    from ratemyrations import database
+
+    return database
+
+
+def dataset_context(database, rng):
+    """Picks realistic arguments (busy date, real users and foods) from the data."""
+    with database.get_connection() as conn:
+        # Reads look at the busiest day; writes go to the next busiest so they
+        # do not change what the reads measure
+        busiest, write_date = (row[0] for row in conn.execute(
+            "SELECT date FROM daily_food_stats GROUP BY date ORDER BY SUM(rating_count) DESC LIMIT 2"
+        ))
+        users = [row[0] for row in conn.execute("SELECT user_id FROM users ORDER BY random() LIMIT 500")]
+        foods = conn.execute("SELECT id, name, station, dining_hall, meal FROM foods").fetchall()
+        max_id = conn.execute("SELECT MAX(id) FROM ratings").fetchone()[0]
+    return {"date": busiest, "write_date": write_date, "users": users, "foods": foods, "max_rating_id": max_id, "rng": rng}
+
+
+def cases(ctx, size, full_scan_limit):
+    """Yields (name, function, setup) for one benchmark each.
+
+    setup() returns the arguments for one call, so per-call input does not
+    count towards the timing. Whole-table reads and rebuilds are skipped
+    above full_scan_limit ratings.
+    """
+    rng = ctx["rng"]
+    counter = itertools.count()
+    date = ctx["date"]
+    write_date = ctx["write_date"]
+    year_start = f"{int(date[:4]) - 1}{date[4:]}"
+    food_ids = [food[0] for food in ctx["foods"]]
+
+    def user():
+        return rng.choice(ctx["users"])
+
+    def food_rows(n, new):
+        rows = [food[1:] for food in rng.sample(ctx["foods"], n)]
+        rows += [(f"New Food {next(counter)}", "Grill", "Burge", "lunch") for _ in range(new)]
+        return rows
+
+    db = ctx["database"]
+
+    def cold(*args):
+        db._LEADERBOARD_CACHE.clear()
+        return args
+    payload = json.dumps({"Burge": {"lunch": {"Grill": [{"id": 1, "name": "x"}] * 200}}})
+    full = size <= full_scan_limit
+    yield "create_tables", db.create_tables, lambda: ()
+    yield "add_food", db.add_food, lambda: (f"New Food {next(counter)}", "Grill", "Burge", "lunch")
+    yield "add_foods_batch", db.add_foods_batch, lambda: (food_rows(200, 20),)
+    yield "add_rating", db.add_rating, lambda: (rng.choice(food_ids), user(), rng.randint(1, 5), write_date)
+    yield "add_ratings_batch", db.add_ratings_batch, lambda: (
+        [(rng.choice(food_ids), user(), rng.randint(1, 5), write_date) for _ in range(100)],
+    )
+    yield "get_ratings", db.get_ratings, lambda: (date,)
+    yield "get_ratings_from_raw", db.get_ratings_from_raw, lambda: (date,)
+    yield "get_food_ratings", db.get_food_ratings, lambda: (date,)
+    yield "get_ratings_version", db.get_ratings_version, lambda: (date,)
+    yield "get_food", db.get_food, lambda: (rng.choice(food_ids),)
+    yield "get_food_history[year]", db.get_food_history, lambda: (rng.choice(food_ids), year_start, date)
+    yield "get_group_history[year]", db.get_group_history, lambda: ("dining_hall", "Burge", year_start, date)
+    yield "get_ratings_range_version[year]", db.get_ratings_range_version, lambda: (year_start, date)
+    yield "get_leaderboard[year,cold]", db.get_leaderboard, lambda: cold(year_start, date)
+    yield "get_leaderboard[hall,cold]", db.get_leaderboard, lambda: cold(year_start, date, "Burge", "lunch")
+    yield "get_leaderboard[year,cached]", db.get_leaderboard, lambda: (year_start, date)
+    yield "search_foods[word]", db.search_foods, lambda: ("chicken",)
+    yield "search_foods[prefix]", db.search_foods, lambda: ("grilled chi",)
+    yield "search_foods[typo]", db.search_foods, lambda: ("chiken curyy",)
+    yield "get_last_rating_event_id", db.get_last_rating_event_id, lambda: ()
+    yield "get_first_rating_event_id", db.get_first_rating_event_id, lambda: ()
+    yield "get_rating_changes", db.get_rating_changes, lambda: (0,)
+    yield "get_food_day_ratings[50]", db.get_food_day_ratings, lambda: (
+        [(date, food_id) for food_id in rng.sample(food_ids, 50)],
+    )
+    if full:
+        yield "get_all_ratings", db.get_all_ratings, lambda: ()
+    yield "get_ratings_page", db.get_ratings_page, lambda: (100,)
+    yield "get_ratings_page[user]", lambda **kw: db.get_ratings_page(100, **kw), lambda: {"user_id": user()}
+    yield "get_ratings_page[q]", lambda **kw: db.get_ratings_page(100, **kw), lambda: {"q": "chicken"}
+    yield "iter_ratings[10k]", lambda: sum(1 for _ in itertools.islice(db.iter_ratings(), 10_000)), lambda: ()
+    if full:
+        yield "get_ratings_summary", db.get_ratings_summary, lambda: ()
+    yield "get_ratings_summary[date]", lambda **kw: db.get_ratings_summary(**kw), lambda: {"date_from": date, "date_to": date}
+    yield "update_user_nickname", db.update_user_nickname, lambda: (user(), f"Nick {next(counter)}")
+    yield "ban_user", db.ban_user, lambda: (user(), "bench")
+    yield "unban_user", db.unban_user, lambda: (user(),)
+    yield "is_user_banned", db.is_user_banned, lambda: (user(),)
+    yield "put_cached_menu", db.put_cached_menu, lambda: (f"2030-01-{next(counter) % 28 + 1:02d}", payload, time.time(), 256)
+    yield "get_cached_menu", db.get_cached_menu, lambda: ("2030-01-01",)
+    yield "put_menu_snapshot", db.put_menu_snapshot, lambda: (f"2030-01-{next(counter) % 28 + 1:02d}", payload, time.time())
+    yield "get_menu_snapshot", db.get_menu_snapshot, lambda: ("2030-01-01",)
+    yield "acquire_menu_fetch_lease", db.acquire_menu_fetch_lease, lambda: (f"lease-{next(counter)}", "bench", 30)
+    yield "get_menu_fetch_lease_expiry", db.get_menu_fetch_lease_expiry, lambda: ("2030-01-01",)
+    yield "release_menu_fetch_lease", db.release_menu_fetch_lease, lambda: (f"lease-{next(counter)}", "bench")
+    yield "delete_rating_by_id", db.delete_rating_by_id, lambda: (rng.randint(1, ctx["max_rating_id"]),)
+    if full:
+        yield "check_rollups", db.check_rollups, lambda: ()
+        yield "rebuild_rollups", db.rebuild_rollups, lambda: ()
+
+
+def time_case(function, setup, min_time, max_repeat):
+    """Returns the median and p95 call time in milliseconds."""
+    args = setup()
+    call = (lambda: function(**args)) if isinstance(args, dict) else (lambda: function(*args))
+    start = time.perf_counter()
+    call()  # warm caches and the statement cache
+    first = time.perf_counter() - start
+    # Slow calls get fewer repeats
+    repeat = max(3, min(max_repeat, int(min_time / max(first, 1e-6))))
+    samples = []
+    for _ in range(repeat):
+        args = setup()
+        call = (lambda: function(**args)) if isinstance(args, dict) else (lambda: function(*args))
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(0.95 * (len(samples) - 1))] * 1000, len(samples)
+
+
+def run_size(size, args):
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="ratemyrations-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    source = os.path.join(data_dir, f"ratings-{size}-seed{args.seed}-v{GENERATOR_VERSION}.db")
+    if not os.path.exists(source):
+        print(f"Generating {size:,} ratings into {source}...")
+        forget_database()
+        generate(source + ".tmp", size, args.seed, verbose=False)
+        os.replace(source + ".tmp", source)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, "bench.db")
+        shutil.copyfile(source, work)
+        database = load_database(work)
+        # Datasets cached by older code get this code's migrations first
+        database.create_tables()
+        ctx = dataset_context(database, random.Random(args.seed))
+        ctx["database"] = database
+        results = {}
+        for name, function, setup in cases(ctx, size, args.full_scan_limit):
+            if args.only and not any(part in name for part in args.only):
+                continue
+            # Same inputs for a function whichever others run before it
+            ctx["rng"].seed(f"{args.seed}-{name}")
+            median, p95, n = time_case(function, setup, args.min_time, args.max_repeat)
+            results[name] = {"median_ms": round(median, 4), "p95_ms": round(p95, 4), "calls": n}
+            print(f"  {name:<32} {median:>10.3f}ms  p95 {p95:>10.3f}ms  ({n} calls)", flush=True)
+        database._POOL.close_all()
+    if not args.data_dir:
+        shutil.rmtree(data_dir)
+    return results
+
+
+def regressions(results, baseline, tolerance, min_delta_ms):
+    failed = []
+    for size, functions in results.items():
+        base_functions = baseline.get("results", {}).get(size, {})
+        for name, stats in functions.items():
+            base = base_functions.get(name)
+            if base is None:
+                continue
+            limit = base["median_ms"] * (1 + tolerance)
+            if stats["median_ms"] > limit and stats["median_ms"] - base["median_ms"] > min_delta_ms:
+                failed.append((size, name, base["median_ms"], stats["median_ms"]))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,1000000", help="comma separated rating counts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="keep generated datasets here between runs")
+    parser.add_argument("--only", action="append", help="run only functions whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend per function")
+    parser.add_argument("--max-repeat", type=int, default=200)
+    parser.add_argument("--full-scan-limit", type=int, default=1_000_000,
+                        help="skip whole-table functions above this many ratings")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 = 50%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="ignore slowdowns smaller than this")
+    parser.add_argument("--output", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"{size:,} ratings")
+        results[str(size)] = run_size(size, args)
+
+    report = {
+        "meta": {
+            "generator_version": GENERATOR_VERSION,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "sqlite": __import__("sqlite3").sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {"meta": report["meta"], "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline["results"] = json.load(f).get("results", {})
+        for size, functions in results.items():
+            baseline["results"].setdefault(size, {}).update(functions)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failed = regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    for size, name, before, after in failed:
+        print(f"REGRESSION {name} at {int(size):,} ratings: {before:.3f}ms -> {after:.3f}ms")
+    if failed:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
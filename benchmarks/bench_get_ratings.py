@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the /api/ratings aggregation.
+Compares the original five-query aggregation, the single-pass aggregation
+over raw ratings and the rollup read at several ratings-per-day sizes.
+
+Usage: python benchmarks/bench_get_ratings.py [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import importlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATE = "2024-01-15"
+HALLS = ["Burge", "Catlett", "Hillcrest"]
+MEALS = ["breakfast", "lunch", "dinner-3"]
+
+
+def legacy_get_ratings(database, date):
+    """The five JOIN + GROUP BY queries get_ratings used to run."""
+    with database.get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT f.name, f.station, f.dining_hall, f.meal, AVG(r.rating), COUNT(r.rating)
+            FROM foods f JOIN ratings r ON f.id = r.food_id
+            WHERE r.date = ? GROUP BY f.id
+        """, (date,))
+        foods = {f"{r[0]}_{r[1]}_{r[2]}_{r[3]}": {"avg_rating": r[4], "rating_count": r[5]} for r in c.fetchall()}
+        c.execute("""
+            SELECT f.name, f.station, f.dining_hall, f.meal, r.rating, COUNT(*)
+            FROM foods f JOIN ratings r ON f.id = r.food_id
+            WHERE r.date = ? GROUP BY f.id, r.rating
+        """, (date,))
+        for r in c.fetchall():
+            dist = foods[f"{r[0]}_{r[1]}_{r[2]}_{r[3]}"].setdefault("dist", {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+            dist[int(r[4])] = r[5]
+        c.execute("""
+            SELECT f.station, f.dining_hall, AVG(r.rating), COUNT(r.rating)
+            FROM foods f JOIN ratings r ON f.id = r.food_id
+            WHERE r.date = ? GROUP BY f.station, f.dining_hall
+        """, (date,))
+        stations = {f"{r[0]}_{r[1]}": {"avg_rating": r[2], "rating_count": r[3]} for r in c.fetchall()}
+        c.execute("""
+            SELECT f.dining_hall, AVG(r.rating), COUNT(r.rating)
+            FROM foods f JOIN ratings r ON f.id = r.food_id
+            WHERE r.date = ? GROUP BY f.dining_hall
+        """, (date,))
+        halls = {r[0]: {"avg_rating": r[1], "rating_count": r[2]} for r in c.fetchall()}
+        c.execute("""
+            SELECT f.dining_hall,
+                   CASE WHEN f.meal LIKE 'breakfast%' THEN 'breakfast'
+                        WHEN f.meal LIKE 'lunch%' THEN 'lunch'
+                        WHEN f.meal LIKE 'dinner%' THEN 'dinner'
+                        ELSE f.meal END AS meal_base,
+                   AVG(r.rating), COUNT(r.rating)
+            FROM foods f JOIN ratings r ON f.id = r.food_id
+            WHERE r.date = ? GROUP BY f.dining_hall, meal_base
+        """, (date,))
+        meals = {f"{r[0]}_{r[1]}": {"avg_rating": r[2], "rating_count": r[3]} for r in c.fetchall()}
+    return {"foods": foods, "stations": stations, "dining_halls": halls, "meals": meals}
+
+
+def populate(database, num_ratings, rng):
+    foods = [
+        (f"Food {i}", f"Station {i % 8}", HALLS[i % len(HALLS)], MEALS[(i // 3) % len(MEALS)])
+        for i in range(300)
+    ]
+    food_ids = database.add_foods_batch(foods)
+    rows = (
+        (rng.choice(food_ids), f"user-{i}", rng.randint(1, 5), DATE)
+        for i in range(num_ratings)
+    )
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO ratings (food_id, user_id, rating, date) VALUES (?, ?, ?, ?)", rows
+        )
+        conn.commit()
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'ratings/day':>12} {'five-query':>12} {'single-pass':>12} {'rollups':>12} {'1-pass x':>9} {'rollup x':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["RATINGS_DB_FILE"] = os.path.join(tmp, "bench.db")
+            from ratemyrations import database
+            database = importlib.reload(database)
+
+            database.create_tables()
+            populate(database, size, random.Random(size))
+
+            if database.get_ratings_from_raw(DATE)["dining_halls"] != database.get_ratings(DATE)["dining_halls"]:
+                print("warning: rollups disagree with raw aggregation")
+
+            legacy = best_of(lambda: legacy_get_ratings(database, DATE), args.repeat)
+            single = best_of(lambda: database.get_ratings_from_raw(DATE), args.repeat)
+            rollup = best_of(lambda: database.get_ratings(DATE), args.repeat)
+            print(
+                f"{size:>12} {legacy * 1000:>10.1f}ms {single * 1000:>10.1f}ms {rollup * 1000:>10.2f}ms"
+                f" {legacy / single:>8.1f}x {legacy / rollup:>8.0f}x"
+            )
+            database._POOL.close_all()
+
+
+if __name__ == "__main__":
+    main()
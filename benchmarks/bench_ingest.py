@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark for rating ingestion.
+Simulates Gunicorn workers (processes) with request threads submitting
+ratings, once with a transaction per rating ("sync") and once through the
+group-committing RatingWriter ("queued"). Reports throughput and latency.
+
+Usage: python benchmarks/bench_ingest.py [--processes 4] [--threads 8] [--ratings 250]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATE = "2024-01-15"
+
+
+def worker(mode, worker_id, threads, ratings, food_ids, flush_ms, batch_size, results):
+    from ratemyrations import database, ingest
+
+    writer = ingest.RatingWriter(flush_ms, batch_size) if mode == "queued" else None
+    latencies = []
+    lock = threading.Lock()
+
+    def client(thread_id):
+        rng = random.Random(worker_id * 1000 + thread_id)
+        local = []
+        for i in range(ratings):
+            # Users re-rate a small set of foods, like at meal rush
+            args = (rng.choice(food_ids), f"user-{worker_id}-{thread_id}-{i % 20}", rng.randint(1, 5), DATE)
+            start = time.perf_counter()
+            if writer is not None:
+                ticket = writer.submit(*args)
+                ticket.wait()
+                if ticket.error is not None:
+                    raise ticket.error
+            else:
+                database.add_rating(*args)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=client, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if writer is not None:
+        writer.stop()
+    results.put(latencies)
+
+
+def run(mode, args, food_ids):
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(
+            target=worker,
+            args=(mode, p, args.threads, args.ratings, food_ids, args.flush_ms, args.batch_size, results),
+        )
+        for p in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    latencies = []
+    for _ in procs:
+        latencies.extend(results.get())
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    return len(latencies) / elapsed, pct(0.50), pct(0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ratings", type=int, default=250, help="ratings per thread")
+    parser.add_argument("--flush-ms", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method("fork")
+    print(f"{'mode':>8} {'ratings/s':>10} {'p50':>9} {'p99':>9}")
+    for mode in ("sync", "queued"):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["RATINGS_DB_FILE"] = os.path.join(tmp, "bench.db")
+            sys.modules.pop("ratemyrations.database", None)
+            sys.modules.pop("ratemyrations.ingest", None)
+            sys.modules.pop("ratemyrations", None)
+            from ratemyrations import database
+
+            database.create_tables()
+            food_ids = database.add_foods_batch(
+                [(f"Food {i}", f"Station {i % 6}", "Burge", "lunch") for i in range(60)]
+            )
+            database._POOL.close_all()
+            throughput, p50, p99 = run(mode, args, food_ids)
+            print(f"{mode:>8} {throughput:>10.0f} {p50:>7.2f}ms {p99:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
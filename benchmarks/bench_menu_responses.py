@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark for /api/menus cache hits.
+Compares serializing the cached menus dict with jsonify on every hit (with
+and without on-the-fly gzip) against serving the pre-encoded bytes stored
+in the cache entry.
+
+Usage: python benchmarks/bench_menu_responses.py [--items 12] [--repeat 2000]
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = (
+    "grilled chicken rice beans tofu pasta marinara cheese pizza salad soup "
+    "tomato basil roasted potato egg bacon pancake curry noodle"
+).split()
+
+
+def make_menus(items_per_station, rng):
+    return {
+        hall: {
+            meal: {
+                f"Station {s}": [
+                    {
+                        "id": rng.randint(1, 99999),
+                        "name": " ".join(rng.choice(WORDS) for _ in range(3)).title(),
+                        "meal": meal,
+                    }
+                    for _ in range(items_per_station)
+                ]
+                for s in range(8)
+            }
+            for meal in ("breakfast", "lunch", "dinner")
+        }
+        for hall in ("Burge", "Catlett", "Hillcrest")
+    }
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=12, help="items per station")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("ADMIN_TOKEN", "bench")
+    os.environ["RATINGS_DB_FILE"] = os.path.join(tmp.name, "bench.db")
+    os.environ["NUTRISLICE_BASE_URL"] = "http://127.0.0.1:9"
+    os.environ["SHARED_CACHE_ENABLED"] = "false"
+    os.environ["MENU_SNAPSHOTS_ENABLED"] = "false"
+    # Importing the app starts cache warming; let it fail quietly first
+    with contextlib.redirect_stdout(io.StringIO()):
+        from ratemyrations import app as appmod
+        appmod.cache_thread.join()
+    from flask import jsonify
+
+    menus = make_menus(args.items, random.Random(args.items))
+    start = time.perf_counter()
+    entry = appmod._menu_entry(menus, appmod.datetime.now())
+    fill_ms = (time.perf_counter() - start) * 1000
+    variants = entry["variants"]
+    cache_control = "public, max-age=1800"
+
+    def legacy():
+        return jsonify(entry["data"]).get_data()
+
+    def legacy_gzip():
+        return gzip.compress(jsonify(entry["data"]).get_data(), compresslevel=6)
+
+    def encoded():
+        return appmod._encoded_response(variants, entry["etag"], cache_control).get_data()
+
+    print(f"payload: {len(variants['identity'])} bytes, gzip {len(variants['gzip'])},"
+          f" br {len(variants['br']) if 'br' in variants else 'n/a (brotli not installed)'}")
+    print(f"one-time encode on cache fill: {fill_ms:.2f}ms")
+    print(f"{'Accept-Encoding':<20} {'jsonify':>10} {'+gzip':>10} {'pre-encoded':>12} {'speedup':>8}")
+    for accept in ("", "gzip", "gzip, deflate, br"):
+        with appmod.app.test_request_context(headers={"Accept-Encoding": accept}):
+            base = per_call(legacy, args.repeat)
+            base_gz = per_call(legacy_gzip, args.repeat) if accept else None
+            cached = per_call(encoded, args.repeat)
+        reference = base_gz or base
+        print(
+            f"{accept or 'identity':<20} {base * 1e6:>8.1f}us"
+            f" {(f'{base_gz * 1e6:.1f}us' if base_gz else '-'):>10}"
+            f" {cached * 1e6:>10.1f}us {reference / cached:>7.0f}x"
+        )
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
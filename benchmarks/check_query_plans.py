@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Checks that no hot database query falls back to a full table scan.
+Runs representative calls of every request-path database.py function
+against a throwaway, fully migrated database, records every statement they
+execute and looks at its EXPLAIN QUERY PLAN. Scans through an index (ordered
+walks with a LIMIT) and scans of temp tables or subqueries are fine.
+Statements run by triggers are not covered. Exits 1 if any statement scans
+a whole table.
+
+Usage: python benchmarks/check_query_plans.py
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+([\w.]+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def hot_calls(db):
+    """Representative calls of every database function on a request path."""
+    day = "2024-01-15"
+    user = "plan-user"
+    food = ("Plan Check", "Grill", "Burge", "lunch")
+    food_id = db.add_food(*food)  # also loads the food index, a one-off full read
+    return [
+        lambda: db.add_foods_batch([food, ("Plan Check New", "Grill", "Burge", "lunch")]),
+        lambda: db.add_rating(food_id, user, 4, day),
+        lambda: db.add_rating(food_id, user, 5, day),
+        lambda: db.add_ratings_batch([(food_id, user, 3, day), (food_id, "plan-other", 2, day)]),
+        lambda: db.add_rating(food_id, None, 4, day),
+        lambda: db.add_rating(food_id, None, 0, day),
+        lambda: db.get_ratings(day),
+        lambda: db.get_ratings_from_raw(day),
+        lambda: db.get_food_ratings(day),
+        lambda: db.get_ratings_version(day),
+        lambda: db.get_food(food_id),
+        lambda: db.get_food_history(food_id, "2023-01-15", day),
+        lambda: db.get_group_history("dining_hall", "Burge", "2023-01-15", day),
+        lambda: db.get_ratings_range_version("2023-01-15", day),
+        lambda: db.get_leaderboard("2024-01-09", day),
+        lambda: db.get_leaderboard("2024-01-09", day, dining_hall="Burge", meal="lunch"),
+        lambda: db.search_foods("plan che"),
+        lambda: db.search_foods("chek", dining_hall="Burge", meal="lunch"),
+        lambda: db.get_last_rating_event_id(),
+        lambda: db.get_first_rating_event_id(),
+        lambda: db.get_rating_changes(0),
+        lambda: db.get_rating_changes(0, day),
+        lambda: db.get_food_day_ratings([(day, food_id)]),
+        lambda: db.get_ratings_page(50),
+        lambda: db.get_ratings_page(50, cursor=("2024-01-15 12:00:00", 10)),
+        lambda: db.get_ratings_page(50, user_id=user),
+        lambda: db.get_ratings_page(50, food_id=food_id),
+        lambda: db.get_ratings_page(50, q="plan"),
+        lambda: db.get_ratings_page(50, dining_hall="Burge"),
+        lambda: db.get_ratings_page(50, date_from=day, date_to=day),
+        lambda: db.get_ratings_page(50, banned=True),
+        lambda: db.get_ratings_summary(date_from=day, date_to=day),
+        lambda: list(db.iter_ratings(batch_size=10, user_id=user)),
+        lambda: db.update_user_nickname(user, "Planner"),
+        lambda: db.ban_user("plan-other", "check"),
+        lambda: db.is_user_banned(user),
+        lambda: db.unban_user("plan-other"),
+        lambda: db.put_cached_menu(day, "{}", time.time(), 10),
+        lambda: db.get_cached_menu(day),
+        lambda: db.acquire_menu_fetch_lease(day, "plan", 30),
+        lambda: db.get_menu_fetch_lease_expiry(day),
+        lambda: db.release_menu_fetch_lease(day, "plan"),
+        lambda: db.put_menu_snapshot(day, "{}", time.time()),
+        lambda: db.get_menu_snapshot(day),
+        lambda: db.add_rating(food_id, user, 0, day),
+        lambda: db.delete_rating_by_id(1),
+        lambda: db.get_schema_version(),
+    ]
+
+
+def check_query_plans(db):
+    """Returns {statement: [plan lines]} for each hot statement that scans a whole table."""
+    with db.get_connection() as conn:
+        calls = hot_calls(db)
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            for call in calls:
+                call()
+        finally:
+            conn.set_trace_callback(None)
+
+        c = conn.cursor()
+        # sqlite_sequence and friends are a few rows and cannot be indexed
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%'")
+        tables = {row[0] for row in c.fetchall()}
+        problems = {}
+        for sql in dict.fromkeys(" ".join(statement.split()) for statement in statements):
+            if sql.split(" ", 1)[0].upper() not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+                continue
+            aliases = {}
+            for table, alias in TABLE_REFERENCE.findall(sql):
+                aliases[alias or table] = table
+                aliases.setdefault(table, table)
+            c.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[3] for row in c.fetchall()]
+            if any(
+                match and aliases.get(match[1], match[1]) in tables
+                for match in map(FULL_SCAN.match, plan)
+            ):
+                problems[sql] = plan
+    return problems
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RATINGS_DB_FILE"] = os.path.join(tmp, "plans.db")
+        os.environ.setdefault("ADMIN_TOKEN", "plans")
+        from ratemyrations import database
+
+        database.create_tables()
+        problems = check_query_plans(database)
+        database._POOL.close_all()
+
+    for sql, plan in problems.items():
+        print(f"Full table scan: {sql}")
+        for line in plan:
+            print(f"    {line}")
+    print(f"Query plan check: {len(problems)} hot statement(s) scan a whole table")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
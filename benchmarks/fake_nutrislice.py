@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Nutrislice weeks API, for load tests.
+Serves recorded week payloads from a fixtures directory (one
+<school>/<meal>.json per menu, as written by --record), re-dated to the
+requested week, or generated menus when no recording exists. Latency and
+error rate are configurable.
+
+Usage:
+    python benchmarks/fake_nutrislice.py [--port 8089] [--latency-ms 150] [--error-rate 0.02]
+    python benchmarks/fake_nutrislice.py --record benchmarks/fixtures/nutrislice
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "nutrislice")
+WEEK_PATH = re.compile(
+    r"^/menu/api/weeks/school/(?P<school>[^/]+)/menu-type/(?P<meal>[^/]+)/"
+    r"(?P<year>\d+)/(?P<month>\d+)/(?P<day>\d+)/?$"
+)
+WORDS = (
+    "grilled chicken rice beans tofu pasta marinara cheese pizza salad soup "
+    "tomato basil roasted potato egg bacon pancake curry noodle"
+).split()
+STATIONS = ["Grill", "Pasta", "Pizza", "Soup", "Entree", "Vegan", "Deli", "Dessert"]
+
+
+def week_start(day):
+    """Nutrislice weeks run Sunday to Saturday."""
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def generate_week(school, meal, start, items_per_station=8):
+    """Builds a week payload in the Nutrislice shape, stable per school/meal."""
+    rng = random.Random(f"{school}/{meal}")
+    pool = [" ".join(rng.choice(WORDS) for _ in range(3)).title() for _ in range(120)]
+    menu_info = {
+        str(i): {"section_options": {"display_name": station}}
+        for i, station in enumerate(STATIONS, start=1)
+    }
+    days = []
+    for offset in range(7):
+        items = [
+            {"menu_id": menu_id, "food": {"name": rng.choice(pool)}}
+            for menu_id in range(1, len(STATIONS) + 1)
+            for _ in range(items_per_station)
+        ]
+        days.append({
+            "date": (start + timedelta(days=offset)).isoformat(),
+            "menu_info": menu_info,
+            "menu_items": items,
+        })
+    return {"days": days}
+
+
+def redate(payload, start):
+    """Moves a recorded week onto the week starting at start."""
+    days = []
+    for offset, day in enumerate(payload.get("days", [])[:7]):
+        days.append({**day, "date": (start + timedelta(days=offset)).isoformat()})
+    return {**payload, "days": days}
+
+
+class FakeNutrislice:
+    """Threaded HTTP server answering week menu requests."""
+
+    def __init__(self, port=0, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 fixtures_dir=DEFAULT_FIXTURES, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.fixtures_dir = fixtures_dir
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.stats = {"requests": 0, "errors_injected": 0, "not_found": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def _payload(self, school, meal, start):
+        key = (school, meal, start)
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is not None:
+            return body
+        path = os.path.join(self.fixtures_dir, school, f"{meal}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                payload = redate(json.load(f), start)
+        else:
+            payload = generate_week(school, meal, start)
+        body = json.dumps(payload).encode()
+        with self._lock:
+            self._bodies[key] = body
+        return body
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.stats["requests"] += 1
+                    delay = fake.latency + fake._rng.uniform(0, fake.jitter)
+                    fail = fake._rng.random() < fake.error_rate
+                if delay:
+                    time.sleep(delay)
+                match = WEEK_PATH.match(self.path.split("?", 1)[0])
+                if not match:
+                    with fake._lock:
+                        fake.stats["not_found"] += 1
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                if fail:
+                    with fake._lock:
+                        fake.stats["errors_injected"] += 1
+                    self._send(500, b'{"error": "injected"}')
+                    return
+                day = date(int(match["year"]), int(match["month"]), int(match["day"]))
+                self._send(200, fake._payload(match["school"], match["meal"], week_start(day)))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def record(fixtures_dir, day):
+    """Saves the real Nutrislice week payloads for every configured menu."""
+    import requests
+
+    os.environ.setdefault("ADMIN_TOKEN", "record")
+    from ratemyrations import config
+
+    for hall, school, meal in config.MENUS_TO_FETCH:
+        url = (f"{config.NUTRISLICE_BASE_URL}/menu/api/weeks/school/{school}/menu-type/"
+               f"{meal}/{day.year}/{day.month}/{day.day}/?format=json")
+        resp = requests.get(url, timeout=(3, 10))
+        resp.raise_for_status()
+        os.makedirs(os.path.join(fixtures_dir, school), exist_ok=True)
+        path = os.path.join(fixtures_dir, school, f"{meal}.json")
+        with open(path, "w") as f:
+            json.dump(resp.json(), f)
+        print(f"{hall} {meal}: saved {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--record", metavar="DIR", help="save this week's real payloads to DIR and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, date.today())
+        return
+
+    fake = FakeNutrislice(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.fixtures)
+    print(f"Fake Nutrislice listening on {fake.url} (NUTRISLICE_BASE_URL={fake.url})")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
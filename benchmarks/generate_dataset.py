@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Synthetic semester dataset for benchmarks.
+Fills foods, users and ratings with a semester of data: every configured
+hall and meal with its stations, foods that rotate through the menu on
+their own schedule, Zipf-skewed food popularity, and users whose activity
+is heavy-tailed and who each rate a little high or low. Rollups and
+per-date versions are rebuilt afterwards so the database looks like one the
+app grew itself.
+
+Usage: python benchmarks/generate_dataset.py OUTPUT.db [--ratings 1000000] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Bump when the generated data or the schema changes so cached datasets are rebuilt
+GENERATOR_VERSION = 2
+
+STATIONS = ["Grill", "Pasta", "Pizza", "Soup", "Entree", "Vegan", "Deli", "Dessert"]
+WORDS = (
+    "grilled chicken rice beans tofu pasta marinara cheese pizza salad soup tomato "
+    "basil roasted potato egg bacon pancake curry noodle teriyaki beef pork veggie "
+    "spicy garlic lemon honey bbq wrap burrito taco quesadilla chili stir-fry"
+).split()
+MEAL_HOURS = {"breakfast": 8, "lunch": 12, "dinner": 18}
+CHUNK = 100_000
+
+
+def _database(db_file):
+    os.environ["RATINGS_DB_FILE"] = db_file
+    os.environ.setdefault("ADMIN_TOKEN", "bench")
+    from ratemyrations import database
+
+    if os.path.abspath(database.DB_FILE) != os.path.abspath(db_file):
+        raise RuntimeError(f"ratemyrations.database is already bound to {database.DB_FILE}")
+    return database
+
+
+def _menus():
+    os.environ.setdefault("ADMIN_TOKEN", "bench")
+    from ratemyrations import config
+
+    return [(hall, meal) for hall, _, meal in config.MENUS_TO_FETCH]
+
+
+def _foods(rng, foods_per_station):
+    """Returns food rows with popularity, quality and a serving schedule."""
+    foods = []
+    for hall, meal in _menus():
+        for station in STATIONS:
+            names = set()
+            while len(names) < foods_per_station:
+                names.add(" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title())
+            for name in sorted(names):
+                foods.append({
+                    "row": (name, station, hall, meal),
+                    "quality": min(4.8, max(1.5, rng.gauss(3.6, 0.7))),
+                    # Served every `period` days starting at `offset`
+                    "period": rng.randint(2, 14),
+                    "offset": rng.randrange(14),
+                })
+    # Zipf popularity over a shuffled ranking
+    ranking = list(range(len(foods)))
+    rng.shuffle(ranking)
+    for rank, index in enumerate(ranking, start=1):
+        foods[index]["popularity"] = 1 / rank ** 1.1
+    return foods
+
+
+def _save_and_drop(conn, table):
+    """Drops a table's indexes and triggers for the bulk load; returns their SQL."""
+    rows = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    for kind, name, _ in rows:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return [sql for _, _, sql in rows]
+
+
+def generate(db_file, ratings=1_000_000, seed=1, start=date(2025, 8, 25), days=112,
+             foods_per_station=40, ratings_per_user=50, banned_fraction=0.01, verbose=True):
+    """Creates db_file filled with about `ratings` ratings; returns the exact count."""
+    began = time.perf_counter()
+    rng = random.Random(seed)
+    database = _database(db_file)
+    database.create_tables()
+    database._POOL.close_all()
+
+    foods = _foods(rng, foods_per_station)
+    for food in foods:
+        food["served"] = range(food["offset"] % food["period"], days, food["period"])
+    user_count = max(50, ratings // ratings_per_user)
+    activity = [rng.paretovariate(1.3) for _ in range(user_count)]
+    bias = [rng.gauss(0, 0.6) for _ in range(user_count)]
+    total_activity = sum(activity)
+    cum_popularity = []
+    running = 0.0
+    for food in foods:
+        running += food["popularity"]
+        cum_popularity.append(running)
+    # A user rates each food at most once
+    max_per_user = len(foods) // 2
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    food_ids = []
+    for food in foods:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO foods (name, station, dining_hall, meal) VALUES (?, ?, ?, ?)",
+            food["row"],
+        )
+        food_ids.append(cur.lastrowid)
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (user_id, nickname, is_banned, ban_reason) VALUES (?, ?, ?, ?)",
+        (
+            (
+                f"user-{u}",
+                f"Student {u}" if rng.random() < 0.05 else None,
+                banned,
+                "spam" if banned else None,
+            )
+            for u in range(user_count)
+            for banned in [rng.random() < banned_fraction]
+        ),
+    )
+
+    saved = _save_and_drop(conn, "ratings")
+    buffer = []
+    written = 0
+
+    def flush():
+        nonlocal written
+        conn.executemany(
+            "INSERT INTO ratings (food_id, user_id, rating, date, timestamp) VALUES (?, ?, ?, ?, ?)",
+            buffer,
+        )
+        written += len(buffer)
+        buffer.clear()
+
+    user = 0
+    while written + len(buffer) < ratings:
+        if user >= user_count:
+            # Capped users fell short of the target; bring in more users
+            activity.append(rng.paretovariate(1.3))
+            bias.append(rng.gauss(0, 0.6))
+            conn.execute("INSERT INTO users (user_id) VALUES (?)", (f"user-{user}",))
+        share = round(ratings * activity[user] / total_activity)
+        want = min(max(1, share), max_per_user, ratings - written - len(buffer))
+        chosen = set()
+        while len(chosen) < want:
+            chosen.update(rng.choices(range(len(foods)), cum_weights=cum_popularity, k=want - len(chosen)))
+        for index in chosen:
+            food = foods[index]
+            day = start + timedelta(days=rng.choice(food["served"]))
+            value = round(food["quality"] + bias[user] + rng.gauss(0, 0.8))
+            meal = food["row"][3].split("-")[0]
+            stamp = (f"{day.isoformat()} {MEAL_HOURS.get(meal, 12) + rng.randrange(3):02d}:"
+                     f"{rng.randrange(60):02d}:{rng.randrange(60):02d}")
+            buffer.append((food_ids[index], f"user-{user}", min(5, max(1, value)), day.isoformat(), stamp))
+        if len(buffer) >= CHUNK:
+            flush()
+            if verbose:
+                print(f"  {written:,} ratings...", flush=True)
+        user += 1
+    if buffer:
+        flush()
+
+    for sql in saved:
+        conn.execute(sql)
+    conn.execute("DELETE FROM ratings_versions")
+    conn.execute("INSERT INTO ratings_versions (date, version) SELECT date, COUNT(*) FROM ratings GROUP BY date")
+    conn.commit()
+    conn.close()
+
+    database.rebuild_rollups()
+    database._POOL.close_all()
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    if verbose:
+        print(f"Generated {written:,} ratings, {len(foods):,} foods and {user:,} users"
+              f" in {time.perf_counter() - began:.1f}s")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="database file to create")
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 8, 25), help="first day of the semester")
+    parser.add_argument("--days", type=int, default=112, help="semester length in days")
+    parser.add_argument("--foods-per-station", type=int, default=40)
+    parser.add_argument("--ratings-per-user", type=int, default=50, help="average, sets the number of users")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    generate(args.output, args.ratings, args.seed, args.start, args.days,
+             args.foods_per_station, args.ratings_per_user)
+
+
+if __name__ == "__main__":
+    main()
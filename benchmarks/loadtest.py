@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Load test for the app under Gunicorn against a local fake Nutrislice.
+Starts benchmarks/fake_nutrislice.py and Gunicorn on a throwaway database,
+drives a mix of /api/menus, /api/ratings and /api/rate traffic from client
+processes, and writes throughput, p50/p95/p99 latency and error rates per
+endpoint to a JSON file. Pass --compare with an earlier result to see the
+change between releases.
+
+Usage:
+    python benchmarks/loadtest.py [--duration 30] [--clients 32] [--workers 4]
+        [--mix menus=50,ratings=30,rate=20] [--upstream-latency-ms 150]
+        [--output loadtest.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("menus", "ratings", "day", "rate")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+def client_process(base_url, threads, args, start_at, results):
+    """Runs closed-loop clients until the deadline and returns raw samples."""
+    samples = []
+    lock = threading.Lock()
+    today = date.today()
+    dates = [(today + timedelta(days=d)).isoformat() for d in range(args.days_ahead + 1)]
+    names = list(args.mix)
+    weights = [args.mix[n] for n in names]
+    measure_from = start_at + args.warmup
+    deadline = measure_from + args.duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        user_id = f"load-user-{rng.randrange(args.users)}"
+        food_ids = []
+        local = []
+        while time.time() < start_at:
+            time.sleep(0.01)
+        while True:
+            now = time.time()
+            if now >= deadline:
+                break
+            # Most visitors look at today; some browse the next days
+            day = dates[0] if rng.random() < 0.7 else rng.choice(dates)
+            endpoint = rng.choices(names, weights)[0]
+            if endpoint == "rate" and not food_ids:
+                endpoint = "menus"
+            started = time.perf_counter()
+            try:
+                if endpoint == "rate":
+                    # Popularity is skewed: a few foods get most ratings
+                    food_id = food_ids[int(len(food_ids) * rng.random() ** 3)]
+                    resp = session.post(f"{base_url}/api/rate", json={
+                        "food_id": food_id,
+                        "rating": rng.choices([1, 2, 3, 4, 5], [1, 2, 4, 6, 4])[0],
+                        "user_id": user_id,
+                        "date": dates[0],
+                    }, timeout=30)
+                else:
+                    resp = session.get(f"{base_url}/api/{endpoint}", params={"date": day}, timeout=30)
+                status = resp.status_code
+                if endpoint == "menus" and status == 200 and day == dates[0] and not food_ids:
+                    food_ids = [
+                        item["id"]
+                        for meals in resp.json().values()
+                        for stations in meals.values()
+                        for items in stations.values()
+                        for item in items
+                    ]
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if now >= measure_from:
+                local.append((endpoint, status, elapsed))
+            if args.think_ms:
+                time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+        with lock:
+            samples.extend(local)
+
+    seed = os.getpid()
+    pool = [threading.Thread(target=client, args=(seed * 1000 + t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(samples)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] * 1000
+
+
+def summarize(samples, duration):
+    def describe(rows):
+        latencies = sorted(elapsed for _, _, elapsed in rows)
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(
+            count for status, count in statuses.items()
+            if not status.isdigit() or int(status) >= 400
+        )
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / duration, 2),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+            "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            "status_counts": statuses,
+        }
+
+    by_endpoint = {}
+    for row in samples:
+        by_endpoint.setdefault(row[0], []).append(row)
+    return {
+        "overall": describe(samples),
+        "endpoints": {name: describe(rows) for name, rows in sorted(by_endpoint.items())},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"{'endpoint':<10} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>8}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        line = (
+            f"{name:<10} {stats['throughput_rps']:>9.1f}"
+            f" {stats['p50_ms'] or 0:>7.1f}ms {stats['p95_ms'] or 0:>7.1f}ms"
+            f" {stats['p99_ms'] or 0:>7.1f}ms {stats['error_rate']:>7.2%}"
+        )
+        base = baseline and (baseline["overall"] if name == "overall" else baseline["endpoints"].get(name))
+        if base and base["throughput_rps"] and base["p95_ms"]:
+            line += (
+                f"   vs baseline: req/s {stats['throughput_rps'] / base['throughput_rps'] - 1:+.1%},"
+                f" p95 {(stats['p95_ms'] or 0) / base['p95_ms'] - 1:+.1%}"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent client threads")
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a client's requests")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("menus=50,ratings=30,rate=20"),
+                        help=f"endpoint weights ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--days-ahead", type=int, default=3, help="dates browsed after today")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--threads", type=int, default=1, help="threads per Gunicorn worker")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app configuration, e.g. RATE_INGEST_MODE=queued")
+    parser.add_argument("--upstream-latency-ms", type=float, default=150)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=50)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "benchmarks", "fixtures", "nutrislice"))
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    procs = []
+    base_url = args.url
+    try:
+        if base_url is None:
+            fake_port = free_port()
+            procs.append(subprocess.Popen([
+                sys.executable, os.path.join(ROOT, "benchmarks", "fake_nutrislice.py"),
+                "--port", str(fake_port),
+                "--latency-ms", str(args.upstream_latency_ms),
+                "--jitter-ms", str(args.upstream_jitter_ms),
+                "--error-rate", str(args.upstream_error_rate),
+                "--fixtures", args.fixtures,
+            ], stdout=subprocess.DEVNULL))
+
+            env = dict(os.environ)
+            env.update({
+                "ADMIN_TOKEN": env.get("ADMIN_TOKEN", "loadtest"),
+                "RATINGS_DB_FILE": os.path.join(tmp.name, "loadtest.db"),
+                "NUTRISLICE_BASE_URL": f"http://127.0.0.1:{fake_port}",
+                # The load comes from one address; keep the limiter out of the way
+                "RATE_LIMIT_DEFAULT": "100000000 per minute",
+                "RATE_LIMIT_STORAGE_URI": "memory://",
+            })
+            env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            env.update(item.split("=", 1) for item in args.app_env)
+            subprocess.run([sys.executable, os.path.join(ROOT, "ratemyrations", "database.py")],
+                           env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+            app_port = free_port()
+            procs.append(subprocess.Popen([
+                sys.executable, "-m", "gunicorn",
+                "-w", str(args.workers), "-k", args.worker_class, "--threads", str(args.threads),
+                "-b", f"127.0.0.1:{app_port}", "ratemyrations.wsgi:application",
+            ], env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            base_url = f"http://127.0.0.1:{app_port}"
+            wait_for(f"{base_url}/healthz")
+
+        multiprocessing.set_start_method("fork")
+        results = multiprocessing.Queue()
+        start_at = time.time() + 1
+        per_process = [args.clients // args.client_processes] * args.client_processes
+        for i in range(args.clients % args.client_processes):
+            per_process[i] += 1
+        clients = [
+            multiprocessing.Process(target=client_process, args=(base_url, threads, args, start_at, results))
+            for threads in per_process if threads
+        ]
+        print(f"Loading {base_url} with {args.clients} clients for {args.warmup:g}s warmup + {args.duration:g}s...")
+        for p in clients:
+            p.start()
+        samples = []
+        for _ in clients:
+            samples.extend(results.get())
+        for p in clients:
+            p.join()
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        tmp.cleanup()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.fromtimestamp(start_at).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {
+                key: value for key, value in vars(args).items()
+                if key not in ("output", "compare")
+            },
+        },
+        **summarize(samples, args.duration),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
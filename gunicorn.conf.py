@@ -0,0 +1,29 @@
+"""
+Gunicorn hooks, loaded automatically when Gunicorn is started from the
+repository root.
+
+With PROMETHEUS_MULTIPROC_DIR set, workers write their metric samples to that
+directory; clear it on startup so counters from a previous run are not
+added in, and forget workers as they exit.
+"""
+
+import glob
+import os
+
+try:
+    from prometheus_client import multiprocess
+except ImportError:
+    multiprocess = None
+
+
+def on_starting(server):
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if multiprocess is not None and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
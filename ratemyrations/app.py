@@ -1,19 +1,36 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, g, jsonify, request, render_template
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import base64
+import binascii
+import csv
+import gzip
+import hashlib
+import io
 import json
 import os
+import zlib
+import click
 from collections import OrderedDict
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip variants are cached
+    brotli = None
+
 from . import database
 from . import config
+from . import events
+from . import ingest
+from . import metrics
 
 app = Flask(__name__, template_folder='templates')
 
@@ -29,15 +46,54 @@ limiter = Limiter(
     storage_uri=rate_limit_storage_uri,
 )
 
-# Cache configuration (LRU with TTL)
+# Request latency and database timings for /metrics
+metrics.install_database_observers(database)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+
+# Cache configuration (LRU with TTL); the shared cache in the database sits
+# behind this per-worker cache so workers on a host fetch each date once
 import threading
+import time
 CACHE_LOCK = threading.RLock()
 CACHE = OrderedDict()
 CACHE_DURATION = timedelta(minutes=config.CACHE_MINUTES)
+# Entries older than CACHE_DURATION but younger than this are served stale
+# while a background refresh runs
+CACHE_HARD_DURATION = max(CACHE_DURATION, timedelta(minutes=config.CACHE_HARD_MINUTES))
 CACHE_MAX_SIZE = config.CACHE_MAX_SIZE
 
 # Background cache warming will be started after fetch_all_menus is defined
 
+# Optional write-behind ingestion for /api/rate
+RATING_WRITER = None
+if config.RATE_INGEST_MODE == "queued":
+    import atexit
+    RATING_WRITER = ingest.RatingWriter(config.RATE_INGEST_FLUSH_MS, config.RATE_INGEST_BATCH_SIZE)
+    # Flush queued ratings when the worker shuts down
+    atexit.register(RATING_WRITER.stop)
+
+
+# Per-worker fan-out of rating changes to /api/stream clients
+BROADCASTER = None
+if config.SSE_ENABLED:
+    BROADCASTER = events.RatingBroadcaster(
+        config.SSE_POLL_SECONDS, config.SSE_MAX_CLIENTS, config.SSE_MAX_PENDING
+    )
+
 
 def _requests_session():
     session = requests.Session()
@@ -56,89 +112,111 @@ def _requests_session():
 
 HTTP = _requests_session()
 
-def get_menu(dining_hall_name, school, meal, date):
+def get_menu_week(dining_hall_name, school, meal, date):
     """
-    Gets the menu for a specific dining hall, meal, and date, categorized by station.
+    Gets the menus for a dining hall and meal for every day of the Nutrislice
+    week containing date, categorized by station.
+
+    Returns (dining_hall_name, meal, {date_str: categorized_menu}), with None
+    instead of the dict when the request failed.
     """
     url = f"{config.NUTRISLICE_BASE_URL}/menu/api/weeks/school/{school}/menu-type/{meal}/{date.year}/{date.month}/{date.day}/?format=json"
     try:
+        start = time.perf_counter()
         resp = HTTP.get(url, timeout=(3, 10))
+        metrics.observe_upstream(dining_hall_name, meal, time.perf_counter() - start)
         if resp.status_code != 200:
             print(f"HTTP {resp.status_code} error fetching menu for {dining_hall_name} - {meal.capitalize()}")
-            return (dining_hall_name, meal, {})
+            metrics.count_upstream_error(dining_hall_name, meal, f"http_{resp.status_code}")
+            return (dining_hall_name, meal, None)
         
         data = resp.json()
         if not isinstance(data, dict) or "days" not in data:
             print(f"Invalid response format for {dining_hall_name} - {meal.capitalize()}")
-            return (dining_hall_name, meal, {})
-            
+            metrics.count_upstream_error(dining_hall_name, meal, "invalid_format")
+            return (dining_hall_name, meal, None)
+
+        ignore_categories = config.IGNORE_CATEGORIES
+
+        # Collect every day's items first so all foods are added in one batch
+        day_items = []
+        foods_to_add = []
         for day in data.get("days", []):
-            if day.get("date") == date.strftime("%Y-%m-%d"):
-                categorized_menu = {}
-                ignore_categories = config.IGNORE_CATEGORIES
-
-                station_map = {menu_id: station_info["section_options"]["display_name"]
-                               for menu_id, station_info in day.get("menu_info", {}).items()}
-
-                # Batch food additions for better performance
-                foods_to_add = []
-                for item in day.get("menu_items", []):
-                    if item.get("food"):
-                        station_name = station_map.get(str(item.get("menu_id")))
-                        if station_name and station_name not in ignore_categories:
-                            if station_name not in categorized_menu:
-                                categorized_menu[station_name] = []
-
-                            food_name = item["food"]["name"]
-                            foods_to_add.append((food_name, station_name, dining_hall_name, meal))
-                
-                # Add all foods in batch
-                food_ids = database.add_foods_batch(foods_to_add)
-                
-                # Build categorized menu with IDs
-                food_idx = 0
-                for item in day.get("menu_items", []):
-                    if item.get("food"):
-                        station_name = station_map.get(str(item.get("menu_id")))
-                        if station_name and station_name not in ignore_categories:
-                            food_name = item["food"]["name"]
-                            food_id = food_ids[food_idx]
-                            categorized_menu[station_name].append({"id": food_id, "name": food_name, "meal": meal})
-                            food_idx += 1
-
-                if not categorized_menu:
-                    print(f"No menu items found for {dining_hall_name} - {meal.capitalize()} on {date.strftime('%Y-%m-%d')}")
-                    return (dining_hall_name, meal, {})
-
-                return (dining_hall_name, meal, categorized_menu)
-                
-        print(f"No menu data for date {date.strftime('%Y-%m-%d')} for {dining_hall_name} - {meal.capitalize()}")
-        return (dining_hall_name, meal, {})
+            day_date = day.get("date")
+            if not day_date:
+                continue
+
+            station_map = {menu_id: station_info["section_options"]["display_name"]
+                           for menu_id, station_info in day.get("menu_info", {}).items()}
+
+            items = []
+            for item in day.get("menu_items", []):
+                if item.get("food"):
+                    station_name = station_map.get(str(item.get("menu_id")))
+                    if station_name and station_name not in ignore_categories:
+                        food_name = item["food"]["name"]
+                        items.append((station_name, food_name))
+                        foods_to_add.append((food_name, station_name, dining_hall_name, meal))
+            day_items.append((day_date, items))
+
+        food_ids = iter(database.add_foods_batch(foods_to_add))
+
+        # Build categorized menus with IDs
+        week = {}
+        for day_date, items in day_items:
+            categorized_menu = {}
+            for station_name, food_name in items:
+                categorized_menu.setdefault(station_name, []).append(
+                    {"id": next(food_ids), "name": food_name, "meal": meal}
+                )
+            week[day_date] = categorized_menu
+
+        if not week.get(date.strftime("%Y-%m-%d")):
+            print(f"No menu data for date {date.strftime('%Y-%m-%d')} for {dining_hall_name} - {meal.capitalize()}")
+
+        return (dining_hall_name, meal, week)
         
     except requests.exceptions.Timeout:
         print(f"Timeout fetching menu for {dining_hall_name} - {meal.capitalize()}")
-        return (dining_hall_name, meal, {})
+        metrics.count_upstream_error(dining_hall_name, meal, "timeout")
+        return (dining_hall_name, meal, None)
     except requests.exceptions.RequestException as e:
         print(f"Request error fetching menu for {dining_hall_name} - {meal.capitalize()}: {e}")
-        return (dining_hall_name, meal, {})
+        metrics.count_upstream_error(dining_hall_name, meal, "request")
+        return (dining_hall_name, meal, None)
     except (KeyError, TypeError, ValueError) as e:
         print(f"Data parsing error for {dining_hall_name} - {meal.capitalize()}: {e}")
-        return (dining_hall_name, meal, {})
+        metrics.count_upstream_error(dining_hall_name, meal, "parse")
+        return (dining_hall_name, meal, None)
     except Exception as e:
         print(f"Unexpected error fetching menu for {dining_hall_name} - {meal.capitalize()}: {e}")
-        return (dining_hall_name, meal, {})
+        metrics.count_upstream_error(dining_hall_name, meal, "unexpected")
+        return (dining_hall_name, meal, None)
 
-def fetch_all_menus(date_str):
+def _empty_menus():
+    return {"Burge": {}, "Catlett": {}, "Hillcrest": {}}
+
+def fetch_week_menus(date_str):
+    """Fetches menus for every day of the Nutrislice week containing date_str.
+
+    Returns ({date_str: menus}, complete). If any dining hall request
+    failed, complete is False and only the requested date is returned so
+    the gap is not cached for the whole week.
+    """
     date = datetime.strptime(date_str, "%Y-%m-%d")
     menus_to_fetch = config.MENUS_TO_FETCH
-    menus = {"Burge": {}, "Catlett": {}, "Hillcrest": {}}
+    week = {date_str: _empty_menus()}
+    complete = True
 
     with ThreadPoolExecutor(max_workers=len(menus_to_fetch)) as executor:
-        futures = [executor.submit(get_menu, name, school, meal, date) for name, school, meal in menus_to_fetch]
+        futures = [executor.submit(get_menu_week, name, school, meal, date) for name, school, meal in menus_to_fetch]
 
         for future in futures:
             try:
-                dining_hall_name, meal, menu_items = future.result(timeout=15)
+                dining_hall_name, meal, days = future.result(timeout=15)
+                if days is None:
+                    complete = False
+                    continue
                 
                 meal_name = "breakfast"
                 if "lunch" in meal:
@@ -146,43 +224,359 @@ def fetch_all_menus(date_str):
                 elif "dinner" in meal:
                     meal_name = "dinner"
 
-                # Only add non-empty menus to reduce data transfer
-                if menu_items:
-                    menus[dining_hall_name][meal_name] = menu_items
+                for day_date, menu_items in days.items():
+                    menus = week.setdefault(day_date, _empty_menus())
+                    # Only add non-empty menus to reduce data transfer
+                    if menu_items:
+                        menus[dining_hall_name][meal_name] = menu_items
             except Exception as e:
                 print(f"Error processing menu future: {e}")
+                complete = False
                 continue
 
-    return menus
+    _count_fetch_stat("upstream_calls", len(menus_to_fetch))
+    if not complete:
+        return {date_str: week[date_str]}, False
+    return week, True
+
+def fetch_all_menus(date_str):
+    """Fetches menus for a single date."""
+    return fetch_week_menus(date_str)[0][date_str]
+
+def encode_json_variants(data):
+    """Encodes data as compact JSON once, plus gzip and brotli variants.
+
+    Keys are sorted the way jsonify sorts them, so cached responses are
+    identical to freshly serialized ones. Brotli is only used if installed.
+    """
+    body = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    # mtime=0 keeps the gzip bytes identical across workers
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        # Quality 11 is ~10x slower for a few percent; entries are filled on request paths
+        variants["br"] = brotli.compress(body, quality=9)
+    return variants
+
+
+def _menu_entry(menus, timestamp):
+    """Builds a cache entry holding the menus and their encoded response bodies."""
+    variants = encode_json_variants(menus)
+    etag = hashlib.blake2b(variants["identity"], digest_size=16).hexdigest()
+    return {"data": menus, "timestamp": timestamp, "etag": etag, "variants": variants}
+
+
+def _cache_store_local(date_str, entry, prefetched=False):
+    """Stores a cache entry in this worker's LRU cache."""
+    if prefetched:
+        # Cached as part of another date's week; counted on first hit
+        entry["prefetched"] = True
+    with CACHE_LOCK:
+        CACHE[date_str] = entry
+        CACHE.move_to_end(date_str)
+        while len(CACHE) > CACHE_MAX_SIZE:
+            CACHE.popitem(last=False)
+
+
+def _shared_cache_get(date_str):
+    """Reads a date's menus from the cache shared by all workers on this host."""
+    if not config.SHARED_CACHE_ENABLED:
+        return None
+    try:
+        row = database.get_cached_menu(date_str)
+    except Exception as e:
+        print(f"Shared cache read failed for {date_str}: {e}")
+        return None
+    if not row:
+        return None
+    payload, fetched_at = row
+    return _menu_entry(json.loads(payload), datetime.fromtimestamp(fetched_at))
+
+
+def _snapshot_get(date_str):
+    """Reads a date's persisted menu snapshot."""
+    if not config.MENU_SNAPSHOTS_ENABLED:
+        return None
+    try:
+        row = database.get_menu_snapshot(date_str)
+    except Exception as e:
+        print(f"Menu snapshot read failed for {date_str}: {e}")
+        return None
+    if not row:
+        return None
+    payload, fetched_at = row
+    return _menu_entry(json.loads(payload), datetime.fromtimestamp(fetched_at))
+
+
+def is_past_date(date_str, now=None):
+    """Menus for days before today no longer change, so they never expire."""
+    now = now or datetime.now()
+    return date_str < now.strftime("%Y-%m-%d")
+
+
+def _never_expires(date_str, entry, now):
+    """Past dates keep their menus, unless a dining hall was missing from the fetch."""
+    return is_past_date(date_str, now) and not entry.get("partial")
+
+
+def cache_store(date_str, menus, timestamp=None, prefetched=False, complete=True):
+    """Stores menus in the local cache, the shared cache and the snapshot store.
+
+    Menus from a fetch where a dining hall failed (complete=False) are only
+    cached in this worker, and expire even for past dates, so the next
+    fetch can fill the gap; they are never shared or snapshotted. Returns
+    the local cache entry.
+    """
+    timestamp = timestamp or datetime.now()
+    entry = _menu_entry(menus, timestamp)
+    if not complete:
+        entry["partial"] = True
+    _cache_store_local(date_str, entry, prefetched)
+    if not complete:
+        return entry
+    payload = entry["variants"]["identity"].decode()
+    if config.SHARED_CACHE_ENABLED:
+        try:
+            database.put_cached_menu(
+                date_str, payload, timestamp.timestamp(), config.SHARED_CACHE_MAX_SIZE
+            )
+        except Exception as e:
+            print(f"Shared cache write failed for {date_str}: {e}")
+    # A menu with nothing in it (a closed day, or one Nutrislice has not
+    # published yet) never replaces a snapshot
+    if config.MENU_SNAPSHOTS_ENABLED and any(menus.values()):
+        try:
+            database.put_menu_snapshot(date_str, payload, timestamp.timestamp())
+        except Exception as e:
+            print(f"Menu snapshot write failed for {date_str}: {e}")
+    return entry
+
+
+def cache_lookup(date_str, now=None, max_age=CACHE_DURATION):
+    """Returns the cache entry ({"data", "timestamp", "etag", "variants"}) for a date, or None.
+
+    Entries older than max_age are ignored, except for past dates. Checks
+    the local cache, then the shared cache, then the snapshot store.
+    """
+    now = now or datetime.now()
+    with CACHE_LOCK:
+        cached = CACHE.get(date_str)
+        if cached and (_never_expires(date_str, cached, now) or now - cached["timestamp"] < max_age):
+            # Move to end to mark as most-recently used
+            CACHE.move_to_end(date_str)
+            prefetched = cached.pop("prefetched", False)
+        else:
+            cached = None
+    if cached:
+        if prefetched:
+            _count_fetch_stat("upstream_calls_saved", len(config.MENUS_TO_FETCH))
+        return cached
+
+    # One tier at a time: a shared cache hit never reads the snapshot
+    past = is_past_date(date_str, now)
+    for read_tier in (_shared_cache_get, _snapshot_get):
+        entry = read_tier(date_str)
+        if entry and (past or now - entry["timestamp"] < max_age):
+            # Keep the original fetch time so all tiers expire together
+            _cache_store_local(date_str, entry)
+            return entry
+    return None
+
+
+def fetch_and_cache_week(date_str):
+    """Fetches the week containing date_str, caches every day and returns date_str's menus."""
+    week, complete = fetch_week_menus(date_str)
+    timestamp = datetime.now()
+    for day_str, menus in week.items():
+        cache_store(day_str, menus, timestamp, prefetched=day_str != date_str, complete=complete)
+    if len(week) > 1:
+        _count_fetch_stat("week_days_prefetched", len(week) - 1)
+    return week[date_str]
+
+
+def fetch_and_cache_menus(date_str):
+    """Fetches a date's menus and caches them, once per host.
+
+    Workers coordinate through a lease in the shared cache: while another
+    worker is fetching the same date, wait for its result instead of
+    calling Nutrislice again.
+    """
+    if not config.SHARED_CACHE_ENABLED:
+        return fetch_and_cache_week(date_str)
+
+    owner = f"{os.getpid()}-{threading.get_ident()}"
+    started = datetime.now()
+    deadline = time.monotonic() + config.MENU_FETCH_LEASE_SECONDS
+    try:
+        acquired = database.acquire_menu_fetch_lease(date_str, owner, config.MENU_FETCH_LEASE_SECONDS)
+        # Past the deadline the lease holder is stuck; fetch ourselves
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.1)
+            shared = _shared_cache_get(date_str)
+            if shared and shared["timestamp"] >= started:
+                _count_fetch_stat("coalesced_across_workers")
+                _cache_store_local(date_str, shared)
+                return shared["data"]
+            # Waiting only reads; claiming the lease is a write, so try again
+            # only once the holder has released it or let it expire
+            expires_at = database.get_menu_fetch_lease_expiry(date_str)
+            if expires_at is None or expires_at < time.time():
+                acquired = database.acquire_menu_fetch_lease(
+                    date_str, owner, config.MENU_FETCH_LEASE_SECONDS
+                )
+    except Exception as e:
+        print(f"Menu fetch lease unavailable for {date_str}: {e}")
+
+    try:
+        return fetch_and_cache_week(date_str)
+    finally:
+        try:
+            database.release_menu_fetch_lease(date_str, owner)
+        except Exception as e:
+            print(f"Failed to release menu fetch lease for {date_str}: {e}")
+
+# Single-flight: concurrent misses for the same date in this worker share one fetch
+INFLIGHT_LOCK = threading.Lock()
+INFLIGHT_FETCHES = {}
+FETCH_STATS = {
+    "fetches": 0,
+    "coalesced": 0,
+    "coalesced_across_workers": 0,
+    "coalesce_timeouts": 0,
+    "errors": 0,
+    "revalidations": 0,
+    "upstream_calls": 0,
+    "week_days_prefetched": 0,
+    # Calls avoided because a date was already cached with its week
+    "upstream_calls_saved": 0,
+}
+
+
+def _count_fetch_stat(name, amount=1):
+    with INFLIGHT_LOCK:
+        FETCH_STATS[name] += amount
+
+
+def get_menus_single_flight(date_str):
+    """Fetches and caches a date's menus, joining an in-flight fetch if any.
+
+    Callers that join wait up to MENU_FETCH_WAIT_SECONDS and get the same
+    result, or the same exception, as the caller that did the fetch.
+    """
+    with INFLIGHT_LOCK:
+        future = INFLIGHT_FETCHES.get(date_str)
+        leader = future is None
+        if leader:
+            future = INFLIGHT_FETCHES[date_str] = Future()
+            FETCH_STATS["fetches"] += 1
+        else:
+            FETCH_STATS["coalesced"] += 1
+
+    if not leader:
+        try:
+            return future.result(timeout=config.MENU_FETCH_WAIT_SECONDS)
+        except FutureTimeoutError:
+            _count_fetch_stat("coalesce_timeouts")
+            raise
+
+    try:
+        menus = fetch_and_cache_menus(date_str)
+        future.set_result(menus)
+        return menus
+    except Exception as e:
+        _count_fetch_stat("errors")
+        future.set_exception(e)
+        raise
+    finally:
+        with INFLIGHT_LOCK:
+            INFLIGHT_FETCHES.pop(date_str, None)
+
+
+def get_fetch_stats():
+    with INFLIGHT_LOCK:
+        return {**FETCH_STATS, "in_flight": len(INFLIGHT_FETCHES)}
+
+
+def revalidate_in_background(date_str):
+    """Refreshes a date's menus on a background thread unless already in flight."""
+    with INFLIGHT_LOCK:
+        if date_str in INFLIGHT_FETCHES:
+            return
+        FETCH_STATS["revalidations"] += 1
+
+    def refresh():
+        try:
+            get_menus_single_flight(date_str)
+        except Exception as e:
+            print(f"Background revalidation failed for {date_str}: {e}")
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _menu_cache_control(date_str, now):
+    """Lets browsers and a CDN cache menus for as long as this server would."""
+    if is_past_date(date_str, now):
+        return "public, max-age=604800"
+    # Caches subtract the Age header, so max-age is the full fresh period
+    fresh = int(CACHE_DURATION.total_seconds())
+    stale = int((CACHE_HARD_DURATION - CACHE_DURATION).total_seconds())
+    return f"public, max-age={fresh}, stale-while-revalidate={stale}"
+
+
+def _etag_matches(etag):
+    """True if the request's If-None-Match already names etag."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def _with_validators(response, etag, cache_control):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def _not_modified(etag, cache_control):
+    return _with_validators(app.response_class(status=304), etag, cache_control)
+
+
+def _encoded_response(variants, etag, cache_control):
+    """Serves pre-encoded JSON in the best encoding the client accepts.
+
+    Each encoding gets its own ETag, since strong validators are byte-exact.
+    """
+    coding = request.accept_encodings.best_match(
+        [c for c in ("br", "gzip") if c in variants], default="identity"
+    )
+    if coding != "identity":
+        etag = f"{etag}-{coding}"
+    if _etag_matches(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(variants[coding], mimetype="application/json")
+        if coding != "identity":
+            response.headers["Content-Encoding"] = coding
+    response.headers["Vary"] = "Accept-Encoding"
+    return _with_validators(response, etag, cache_control)
+
+
+def _with_cache_headers(response, state, timestamp):
+    """Adds the cache state (fresh, revalidating, stale or miss) and age."""
+    age = max(0, int((datetime.now() - timestamp).total_seconds()))
+    response.headers["X-Cache-State"] = state
+    response.headers["Age"] = str(age)
+    return response
 
 # Pre-warm cache for common dates
 def warm_cache_for_date(date_str):
     """Pre-warm cache for a specific date."""
     try:
-        with CACHE_LOCK:
-            if date_str in CACHE:
-                return  # Already cached
-        
-        menus = fetch_all_menus(date_str)
+        if cache_lookup(date_str) is not None:
+            return  # Already cached
         
-        with CACHE_LOCK:
-            CACHE[date_str] = {
-                "data": menus,
-                "timestamp": datetime.now()
-            }
-            CACHE.move_to_end(date_str)
-            
-            # Enforce cache size limit
-            while len(CACHE) > CACHE_MAX_SIZE:
-                CACHE.popitem(last=False)
+        get_menus_single_flight(date_str)
                 
     except Exception as e:
         print(f"Error warming cache for {date_str}: {e}")
 
 # Background cache warming
-import atexit
-from threading import Thread
-
 def background_cache_warming():
     """Warm cache for today and tomorrow in background."""
     try:
@@ -197,7 +591,7 @@ def background_cache_warming():
         print(f"Background cache warming failed: {e}")
 
 # Start background cache warming
-cache_thread = Thread(target=background_cache_warming, daemon=True)
+cache_thread = threading.Thread(target=background_cache_warming, daemon=True)
 cache_thread.start()
 
 @app.route("/")
@@ -224,8 +618,153 @@ def get_admin_ratings():
     if not token or token != config.ADMIN_TOKEN:
         return jsonify({"error": "Forbidden"}), 403
     
-    ratings = database.get_all_ratings()
-    return jsonify(ratings)
+    # Without paging parameters, keep returning the full list as before
+    if "limit" not in request.args and "cursor" not in request.args:
+        ratings = database.get_all_ratings()
+        return jsonify(ratings)
+
+    try:
+        limit = int(request.args.get("limit", 100))
+        cursor = _decode_cursor(request.args.get("cursor"))
+        filters = _admin_rating_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = max(1, min(limit, config.ADMIN_RATINGS_MAX_PAGE_SIZE))
+
+    ratings, next_cursor = database.get_ratings_page(limit, cursor, **filters)
+    page = {"ratings": ratings, "next_cursor": _encode_cursor(next_cursor)}
+    # Totals only on the first page; they cost a scan of the matching rows
+    if cursor is None:
+        page["summary"] = database.get_ratings_summary(**filters)
+    return jsonify(page)
+
+
+def _encode_cursor(cursor):
+    if cursor is None:
+        return None
+    timestamp, rating_id = cursor
+    return base64.urlsafe_b64encode(f"{timestamp}|{rating_id}".encode()).decode()
+
+
+def _decode_cursor(value):
+    """Parses a cursor from _encode_cursor into (timestamp, id)."""
+    if not value:
+        return None
+    try:
+        timestamp, rating_id = base64.urlsafe_b64decode(value.encode()).decode().rsplit("|", 1)
+        return (timestamp, int(rating_id))
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+def _admin_rating_filters(args):
+    """Reads the admin ratings filters from query parameters."""
+    filters = {
+        "user_id": args.get("user_id") or None,
+        "q": args.get("q") or None,
+        "dining_hall": args.get("dining_hall") or None,
+        "date_from": args.get("date_from") or None,
+        "date_to": args.get("date_to") or None,
+    }
+    for name in ("date_from", "date_to"):
+        if filters[name]:
+            try:
+                datetime.strptime(filters[name], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Invalid {name}. Use YYYY-MM-DD.")
+    if args.get("food_id"):
+        try:
+            filters["food_id"] = int(args["food_id"])
+        except ValueError:
+            raise ValueError("Invalid food_id")
+    banned = args.get("banned", "").lower()
+    if banned in ("true", "false"):
+        filters["banned"] = banned == "true"
+    return filters
+
+
+EXPORT_FIELDS = [
+    "id", "user_id", "nickname", "is_banned", "rating", "date", "timestamp",
+    "food_name", "station", "dining_hall", "meal",
+]
+
+
+def _export_lines(ratings, fmt):
+    """Yields the export as text, one chunk per batch of ratings."""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    for i, rating in enumerate(ratings, 1):
+        if fmt == "csv":
+            writer.writerow(rating)
+        else:
+            buffer.write(json.dumps(rating, separators=(",", ":")))
+            buffer.write("\n")
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _gzip_stream(chunks):
+    """Compresses text chunks into a gzip stream as they are produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route("/api/admin/export")
+def export_ratings():
+    token = request.args.get("token")
+    if not token or token != config.ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        filters = _admin_rating_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = _export_lines(database.iter_ratings(**filters), fmt)
+    filename = f"ratings-{filters['date_from'] or 'start'}-{filters['date_to'] or 'end'}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if request.args.get("gzip", "false").lower() == "true":
+        body = _gzip_stream(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        body = (chunk.encode() for chunk in body)
+
+    response = app.response_class(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@app.route("/api/admin/stats")
+def get_admin_stats():
+    token = request.args.get("token")
+    if not token or token != config.ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+
+    stats = {
+        "db_pool": database.get_pool_stats(),
+        "food_index": database.get_food_index_stats(),
+        "ban_list": database.get_ban_list_stats(),
+        "leaderboard_cache": database.get_leaderboard_cache_stats(),
+        "menu_fetch": get_fetch_stats(),
+    }
+    if RATING_WRITER is not None:
+        stats["rating_writer"] = RATING_WRITER.stats()
+    if BROADCASTER is not None:
+        stats["live_updates"] = BROADCASTER.stats()
+    return jsonify(stats)
 
 
 @app.route("/api/admin/update-nickname", methods=["POST"])
@@ -296,12 +835,8 @@ def delete_admin_rating():
     else:
         return jsonify({"error": "Rating not found"}), 404
 
-@app.route("/api/menus")
-def get_menus_route():
-    start_time = datetime.now()
-    date_str = request.args.get("date", datetime.now().strftime("%Y-%m-%d"))
-    refresh = request.args.get("refresh", "false").lower() == "true"
-
+def _menu_date_error(date_str, now):
+    """Returns an error response if date_str is not a date menus can be served for."""
     # Validate date input
     try:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d")
@@ -309,7 +844,6 @@ def get_menus_route():
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
 
     # Enforce date range if configured
-    now = datetime.now()
     days_diff = (date_obj - now).days
     
     if config.MAX_DAYS_AHEAD is not None and days_diff > config.MAX_DAYS_AHEAD:
@@ -318,49 +852,348 @@ def get_menus_route():
     # Don't allow dates too far in the past (more than 30 days ago)
     if days_diff < -30:
         return jsonify({"error": "Date too far in the past. Please select a date within the last 30 days."}), 400
-    
-        # Thread-safe cache access
-        with CACHE_LOCK:
-            cached = CACHE.get(date_str)
-            if cached and now - cached["timestamp"] < CACHE_DURATION and not refresh:
-                # Move to end to mark as most-recently used
-                CACHE.move_to_end(date_str)
-                response_time = (datetime.now() - start_time).total_seconds()
-                print(f"Cache hit for {date_str} in {response_time:.3f}s")
-                return jsonify(cached["data"])
+    return None
+
+
+def load_menus(date_str, now, refresh=False):
+    """Returns (entry, state) for a date's menus from the caches or a fetch.
+
+    state is "fresh", "revalidating", "miss", or "stale" for an old copy
+    served after a failed fetch. Returns (None, None) if nothing is available.
+    """
+    start_time = datetime.now()
+    if not refresh:
+        cached = cache_lookup(date_str, now, max_age=CACHE_HARD_DURATION)
+        if cached is not None:
+            state = "fresh"
+            if now - cached["timestamp"] >= CACHE_DURATION and not _never_expires(date_str, cached, now):
+                # Stale-while-revalidate: answer now, refresh in the background
+                state = "revalidating"
+                revalidate_in_background(date_str)
+            response_time = (datetime.now() - start_time).total_seconds()
+            print(f"Cache hit ({state}) for {date_str} in {response_time:.3f}s")
+            metrics.count_menu_cache(state)
+            return cached, state
 
     try:
-        menus = fetch_all_menus(date_str)
-        payload = {"data": menus, "timestamp": now}
-        
-        # Thread-safe cache update
-        with CACHE_LOCK:
-            CACHE[date_str] = payload
-            CACHE.move_to_end(date_str)
-            while len(CACHE) > CACHE_MAX_SIZE:
-                CACHE.popitem(last=False)
+        menus = get_menus_single_flight(date_str)
         
         response_time = (datetime.now() - start_time).total_seconds()
         print(f"Menu fetch for {date_str} completed in {response_time:.3f}s")
-        return jsonify(menus)
+        # The fetch already encoded these menus into the cache
+        with CACHE_LOCK:
+            entry = CACHE.get(date_str)
+        if entry is None or entry["data"] is not menus:
+            entry = _menu_entry(menus, now)
+        metrics.count_menu_cache("miss")
+        return entry, "miss"
     except Exception as e:
         print(f"Error fetching menus for {date_str}: {e}")
         
-        # Thread-safe cache access for fallback
+        # Thread-safe cache access for fallback (expired entries are fine here)
         with CACHE_LOCK:
             cached = CACHE.get(date_str)
-            if cached:
-                response_time = (datetime.now() - start_time).total_seconds()
-                print(f"Fallback cache hit for {date_str} in {response_time:.3f}s")
-                return jsonify({"stale": True, **cached["data"]}), 200
-        
+        cached = cached or _shared_cache_get(date_str) or _snapshot_get(date_str)
+        if cached:
+            response_time = (datetime.now() - start_time).total_seconds()
+            print(f"Fallback cache hit for {date_str} in {response_time:.3f}s")
+            metrics.count_menu_cache("stale")
+            return cached, "stale"
+        metrics.count_menu_cache("error")
+        return None, None
+
+
+@app.route("/api/menus")
+def get_menus_route():
+    now = datetime.now()
+    date_str = request.args.get("date", now.strftime("%Y-%m-%d"))
+    refresh = request.args.get("refresh", "false").lower() == "true"
+
+    error = _menu_date_error(date_str, now)
+    if error:
+        return error
+
+    entry, state = load_menus(date_str, now, refresh)
+    if entry is None:
         return jsonify({"error": "Failed to retrieve menus"}), 502
+    if state == "stale":
+        response = jsonify({"stale": True, **entry["data"]})
+        return _with_cache_headers(response, "stale", entry["timestamp"]), 200
+
+    response = _encoded_response(
+        entry["variants"], entry["etag"], _menu_cache_control(date_str, now)
+    )
+    return _with_cache_headers(response, state, entry["timestamp"])
+
+
+def build_day(menus, food_ratings):
+    """Attaches each menu item's ratings (by food id) and aggregates them.
+
+    Aggregates count only foods on this menu. Stations are keyed
+    station_hall_mealslug and meals hall_mealslug, the keys the frontend
+    previously derived by filtering /api/ratings against the menu.
+    """
+    day_menus = {}
+    totals = {"stations": {}, "dining_halls": {}, "meals": {}}
+    counted = set()
+    for hall, meals in menus.items():
+        day_menus[hall] = {}
+        for meal, stations in meals.items():
+            day_menus[hall][meal] = {}
+            for station, items in stations.items():
+                day_items = []
+                for item in items:
+                    rating = food_ratings.get(item["id"])
+                    day_items.append({**item, "rating": rating})
+                    if rating is None or item["id"] in counted:
+                        continue
+                    counted.add(item["id"])
+                    slug = item["meal"]
+                    for level, key in (
+                        ("stations", f"{station}_{hall}_{slug}"),
+                        ("dining_halls", hall),
+                        ("meals", f"{hall}_{slug}"),
+                    ):
+                        total = totals[level].setdefault(key, [0, 0])
+                        total[0] += rating["avg_rating"] * rating["rating_count"]
+                        total[1] += rating["rating_count"]
+                day_menus[hall][meal][station] = day_items
+
+    ratings = {
+        level: {
+            key: {"avg_rating": total / count, "rating_count": count}
+            for key, (total, count) in groups.items()
+        }
+        for level, groups in totals.items()
+    }
+    return {"menus": day_menus, "ratings": ratings}
+
+
+@app.route("/api/day")
+def get_day_route():
+    now = datetime.now()
+    date_str = request.args.get("date", now.strftime("%Y-%m-%d"))
+
+    error = _menu_date_error(date_str, now)
+    if error:
+        return error
+
+    entry, state = load_menus(date_str, now)
+    if entry is None:
+        return jsonify({"error": "Failed to retrieve menus"}), 502
+
+    version = database.get_ratings_version(date_str)
+    etag = None
+    cache_control = "public, no-cache"
+    if state != "stale":
+        etag = f"day-{entry['etag']}-{version}"
+        if _etag_matches(etag):
+            return _with_cache_headers(_not_modified(etag, cache_control), state, entry["timestamp"])
+
+    day = build_day(entry["data"], database.get_food_ratings(date_str))
+    day["date"] = date_str
+    if state == "stale":
+        day["stale"] = True
+    response = jsonify(day)
+    if etag:
+        _with_validators(response, etag, cache_control)
+    return _with_cache_headers(response, state, entry["timestamp"])
 
 @app.route("/api/ratings")
 def get_ratings_route():
     date_str = request.args.get("date", datetime.now().strftime("%Y-%m-%d"))
+    # Read the version before the ratings: a change in between can only make
+    # the ETag older than the body, which just costs the client a refetch
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+        version = database.get_ratings_version(date_str)
+    except ValueError:
+        version = None  # Not a date; never matches any ratings anyway
+    if version is None:
+        return jsonify(database.get_ratings(date_str))
+
+    etag = f"ratings-{date_str}-{version}"
+    # Ratings change at any time, so caches must revalidate on every use
+    cache_control = "public, no-cache"
+    if _etag_matches(etag):
+        return _not_modified(etag, cache_control)
     ratings = database.get_ratings(date_str)
-    return jsonify(ratings)
+    return _with_validators(jsonify(ratings), etag, cache_control)
+
+
+def _history_range(args, today):
+    """Reads date_from and date_to (inclusive) for a history request.
+
+    Defaults to the HISTORY_DEFAULT_DAYS days ending today. Raises ValueError
+    for bad dates or a range longer than HISTORY_MAX_DAYS.
+    """
+    try:
+        date_to = datetime.strptime(args.get("date_to") or today.strftime("%Y-%m-%d"), "%Y-%m-%d")
+        if args.get("date_from"):
+            date_from = datetime.strptime(args["date_from"], "%Y-%m-%d")
+        else:
+            date_from = date_to - timedelta(days=config.HISTORY_DEFAULT_DAYS - 1)
+    except ValueError:
+        raise ValueError("Invalid date_from or date_to. Use YYYY-MM-DD.")
+    if date_from > date_to:
+        raise ValueError("date_from is after date_to.")
+    if (date_to - date_from).days >= config.HISTORY_MAX_DAYS:
+        raise ValueError(f"Date range is longer than {config.HISTORY_MAX_DAYS} days.")
+    return date_from.strftime("%Y-%m-%d"), date_to.strftime("%Y-%m-%d")
+
+
+def _history_summary(days):
+    """Totals a history series into one average, count and distribution."""
+    count = sum(day["rating_count"] for day in days)
+    dist = {value: sum(day["dist"][value] for day in days) for value in range(1, 6)}
+    return {
+        "avg_rating": sum(value * n for value, n in dist.items()) / count if count else None,
+        "rating_count": count,
+        "dist": dist,
+    }
+
+
+def _history_response(key, date_from, date_to, build, **fields):
+    """Serves build()'s series with fields, revalidated against the range's rating version."""
+    version = database.get_ratings_range_version(date_from, date_to)
+    etag = f"history-{key}-{date_from}-{date_to}-{version}"
+    cache_control = "public, no-cache"
+    if _etag_matches(etag):
+        return _not_modified(etag, cache_control)
+    days = build()
+    body = {**fields, "date_from": date_from, "date_to": date_to, "days": days, "summary": _history_summary(days)}
+    return _with_validators(jsonify(body), etag, cache_control)
+
+
+@app.route("/api/foods/<int:food_id>/history")
+def food_history_route(food_id):
+    try:
+        date_from, date_to = _history_range(request.args, datetime.now())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    food = database.get_food(food_id)
+    if food is None:
+        return jsonify({"error": "Food not found"}), 404
+    return _history_response(
+        f"food-{food_id}", date_from, date_to,
+        lambda: database.get_food_history(food_id, date_from, date_to),
+        food=food,
+    )
+
+
+@app.route("/api/halls/<dining_hall>/history")
+def hall_history_route(dining_hall):
+    scope, error = _parse_scope_args(request.args, dining_hall)
+    if error:
+        return error
+    meal = scope[1]
+    try:
+        date_from, date_to = _history_range(request.args, datetime.now())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    level, group_key = ("meal", f"{dining_hall}_{meal}") if meal else ("dining_hall", dining_hall)
+    return _history_response(
+        f"{level}-{group_key}", date_from, date_to,
+        lambda: database.get_group_history(level, group_key, date_from, date_to),
+        dining_hall=dining_hall, meal=meal,
+    )
+
+
+# Days in each /api/leaderboard window, ending today
+LEADERBOARD_WINDOWS = {"week": 7, "month": 30}
+
+
+def _leaderboard_range(args, today):
+    """Returns (window, date_from, date_to) for a leaderboard request.
+
+    An explicit date_from/date_to wins over window (week, month or
+    semester). Raises ValueError for anything invalid.
+    """
+    if args.get("date_from") or args.get("date_to"):
+        return ("custom",) + _history_range(args, today)
+    window = args.get("window", "week")
+    if window == "semester":
+        date_to = today
+        date_from = today - timedelta(days=config.SEMESTER_DAYS - 1)
+        if config.SEMESTER_START:
+            start = datetime.strptime(config.SEMESTER_START, "%Y-%m-%d")
+            # Before the semester starts, show the whole of the last one
+            if start <= today:
+                date_from = max(start, today - timedelta(days=config.HISTORY_MAX_DAYS - 1))
+    elif window in LEADERBOARD_WINDOWS:
+        date_to = today
+        date_from = today - timedelta(days=LEADERBOARD_WINDOWS[window] - 1)
+    else:
+        raise ValueError("Invalid window. Use week, month or semester.")
+    return window, date_from.strftime("%Y-%m-%d"), date_to.strftime("%Y-%m-%d")
+
+
+@app.route("/api/leaderboard")
+def leaderboard_route():
+    try:
+        window, date_from, date_to = _leaderboard_range(request.args, datetime.now())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        limit = int(request.args.get("limit", "10"))
+        min_ratings = int(request.args.get("min_ratings", config.LEADERBOARD_MIN_RATINGS))
+    except ValueError:
+        limit = min_ratings = 0
+    if not 1 <= limit <= config.LEADERBOARD_MAX_LIMIT or min_ratings < 1:
+        return jsonify({"error": f"limit must be 1-{config.LEADERBOARD_MAX_LIMIT} and min_ratings at least 1."}), 400
+    scope, error = _parse_scope_args(request.args)
+    if error:
+        return error
+    dining_hall, meal = scope
+
+    board = database.get_leaderboard(
+        date_from, date_to, dining_hall, meal, limit,
+        prior_weight=config.LEADERBOARD_PRIOR_WEIGHT,
+        prior_mean=config.LEADERBOARD_PRIOR_MEAN,
+        min_ratings=min_ratings,
+    )
+    etag = (f"leaderboard-{date_from}-{date_to}-{dining_hall or 'all'}-{meal or 'all'}"
+            f"-{limit}-{min_ratings}-{board['version']}")
+    cache_control = "public, no-cache"
+    if _etag_matches(etag):
+        return _not_modified(etag, cache_control)
+    return _with_validators(jsonify({
+        "window": window,
+        "date_from": date_from,
+        "date_to": date_to,
+        "dining_hall": dining_hall,
+        "meal": meal,
+        "prior": board["prior"],
+        "total_foods": board["total_foods"],
+        "foods": board["foods"],
+    }), etag, cache_control)
+
+
+@app.route("/api/search")
+def search_route():
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing q."}), 400
+    try:
+        limit = int(request.args.get("limit", config.SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= config.SEARCH_MAX_LIMIT:
+        return jsonify({"error": f"limit must be 1-{config.SEARCH_MAX_LIMIT}."}), 400
+    scope, error = _parse_scope_args(request.args)
+    if error:
+        return error
+    dining_hall, meal = scope
+
+    result = database.search_foods(query, limit, dining_hall, meal)
+    return jsonify({
+        "query": query,
+        "dining_hall": dining_hall,
+        "meal": meal,
+        "foods": result["foods"],
+        "suggestions": result["suggestions"],
+    })
 
 
 @app.errorhandler(429)
@@ -375,39 +1208,196 @@ def internal_error_handler(e):
 @app.route("/api/rate", methods=["POST"])
 def rate_route():
     start_time = datetime.now()
-    data = request.get_json()
-    if not data:
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
         return jsonify({"error": "Invalid JSON data"}), 400
-    
+
     user_id = data.get("user_id")
-    date_str = data.get("date", datetime.now().strftime("%Y-%m-%d"))
-    food_id = data.get("food_id")
-    rating = data.get("rating")
+    if user_id is not None and not isinstance(user_id, str):
+        return jsonify({"error": "user_id must be a string"}), 400
+    parsed, error = _parse_rating(data, datetime.now().strftime("%Y-%m-%d"))
+    if error:
+        return jsonify({"error": error}), 400
+    food_id, rating, date_str = parsed
+
+    # Check if user is banned
+    if user_id and database.is_user_banned(user_id):
+        return jsonify({"error": "User is banned"}), 403
     
-    # Validate required fields
+    if RATING_WRITER is not None:
+        # Group commit: respond once the batch holding this rating is durable
+        ticket = RATING_WRITER.submit(food_id, user_id, rating, date_str)
+        if not ticket.wait(config.RATE_INGEST_ACK_TIMEOUT):
+            return jsonify({"status": "queued"}), 202
+        if ticket.error is not None:
+            return jsonify({"error": "Failed to save rating"}), 503
+    else:
+        database.add_rating(food_id, user_id, rating, date_str)
+    if BROADCASTER is not None:
+        # Streams on this worker need not wait for the next poll
+        BROADCASTER.notify()
+    response_time = (datetime.now() - start_time).total_seconds()
+    print(f"Rating submission completed in {response_time:.3f}s")
+    return jsonify({"status": "success"})
+
+def _parse_rating(entry, default_date):
+    """Validates a /api/rate body or /api/rate/batch entry; returns (food_id, rating, date) or an error."""
+    if not isinstance(entry, dict):
+        return None, "entry must be an object"
+    food_id = entry.get("food_id")
     if not food_id:
-        return jsonify({"error": "food_id is required"}), 400
-    
-    # Validate rating value
+        return None, "food_id is required"
+    try:
+        food_id = int(food_id)
+    except (ValueError, TypeError):
+        return None, "food_id must be a number"
+    rating = entry.get("rating")
     if rating is None:
-        return jsonify({"error": "rating is required"}), 400
-    
+        return None, "rating is required"
     try:
         rating = int(rating)
     except (ValueError, TypeError):
-        return jsonify({"error": "rating must be a number"}), 400
-    
+        return None, "rating must be a number"
     if rating not in [0, 1, 2, 3, 4, 5]:
-        return jsonify({"error": "rating must be between 0 and 5"}), 400
-    
-    # Check if user is banned
+        return None, "rating must be between 0 and 5"
+    date_str = entry.get("date", default_date)
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None, "Invalid date format. Use YYYY-MM-DD."
+    return (food_id, rating, date_str), None
+
+
+def _parse_scope_args(args, dining_hall=None):
+    """Validates the dining_hall and meal filters; returns ((dining_hall, meal), None) or an error response.
+
+    A dining_hall from the URL path wins over the query string.
+    """
+    dining_hall = dining_hall or args.get("dining_hall") or None
+    if dining_hall and dining_hall not in {hall for hall, _, _ in config.MENUS_TO_FETCH}:
+        return None, (jsonify({"error": "Dining hall not found"}), 404)
+    meal = args.get("meal") or None
+    if meal not in (None, "breakfast", "lunch", "dinner"):
+        return None, (jsonify({"error": "Invalid meal. Use breakfast, lunch or dinner."}), 400)
+    return (dining_hall, meal), None
+
+
+@app.route("/api/rate/batch", methods=["POST"])
+def rate_batch_route():
+    start_time = datetime.now()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("ratings"), list):
+        return jsonify({"error": "ratings must be a list"}), 400
+    entries = data["ratings"]
+    if not entries:
+        return jsonify({"error": "ratings must not be empty"}), 400
+    if len(entries) > config.RATE_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {config.RATE_BATCH_MAX_ITEMS} ratings per batch"}), 400
+
+    user_id = data.get("user_id")
+    if user_id is not None and not isinstance(user_id, str):
+        return jsonify({"error": "user_id must be a string"}), 400
+    default_date = data.get("date", datetime.now().strftime("%Y-%m-%d"))
+
+    # Validate everything first; invalid entries are reported, not applied
+    results = []
+    positions = {}
+    to_apply = []
+    for entry in entries:
+        parsed, error = _parse_rating(entry, default_date)
+        if error:
+            results.append({"status": "error", "error": error})
+            continue
+        food_id, rating, date_str = parsed
+        results.append({"food_id": food_id, "date": date_str})
+        # Last click wins when a food is rated more than once in a batch
+        key = (food_id, date_str)
+        if key not in positions:
+            positions[key] = len(to_apply)
+            to_apply.append(None)
+        to_apply[positions[key]] = (food_id, user_id, rating, date_str)
+
+    if not to_apply:
+        return jsonify({"error": "No valid ratings", "results": results}), 400
+
+    # One ban check for the whole batch
     if user_id and database.is_user_banned(user_id):
         return jsonify({"error": "User is banned"}), 403
-    
-    database.add_rating(food_id, user_id, rating, date_str)
+
+    try:
+        outcomes = database.add_ratings_batch(to_apply)
+    except Exception as e:
+        print(f"Failed to save rating batch of {len(to_apply)}: {e}")
+        return jsonify({"error": "Failed to save ratings"}), 503
+    if BROADCASTER is not None:
+        BROADCASTER.notify()
+
+    for result in results:
+        if "food_id" in result:
+            result["status"] = outcomes[positions[(result["food_id"], result["date"])]]
+    # The new totals, so the page can update without refetching /api/ratings
+    ratings = database.get_food_day_ratings([(date_str, food_id) for food_id, date_str in positions])
     response_time = (datetime.now() - start_time).total_seconds()
-    print(f"Rating submission completed in {response_time:.3f}s")
-    return jsonify({"status": "success"})
+    print(f"Rating batch of {len(to_apply)} completed in {response_time:.3f}s")
+    return jsonify({"status": "success", "results": results, "ratings": ratings})
+
+
+def _sse(event, data=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+@app.route("/api/stream")
+def rating_stream_route():
+    """Server-Sent Events stream of rating changes for a date."""
+    if BROADCASTER is None:
+        return jsonify({"error": "Live updates are disabled"}), 404
+    date_str = request.args.get("date", datetime.now().strftime("%Y-%m-%d"))
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = BROADCASTER.subscribe(date_str, last_event_id)
+    if subscription is None:
+        response = jsonify({"error": "Too many live update streams"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    def stream():
+        deadline = time.monotonic() + config.SSE_MAX_STREAM_SECONDS
+        try:
+            yield "retry: 3000\n: connected\n\n"
+            while time.monotonic() < deadline:
+                item = subscription.get(config.SSE_HEARTBEAT_SECONDS)
+                if item is None:
+                    # Heartbeat keeps proxies from closing an idle stream and
+                    # surfaces disconnected clients as write errors
+                    yield ": ping\n\n"
+                elif item[0] == "resync":
+                    yield _sse("resync")
+                else:
+                    event_id, changes = item
+                    yield _sse("ratings", changes, event_id)
+        finally:
+            BROADCASTER.unsubscribe(subscription)
+
+    response = app.response_class(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 
 @app.route("/api/delete-ratings", methods=["POST"])
 def delete_ratings_route():
@@ -420,6 +1410,16 @@ def delete_ratings_route():
     return jsonify({"status": "success"})
 
 
+@app.route("/metrics")
+def metrics_route():
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled (is prometheus_client installed?)"}), 404
+    if config.METRICS_TOKEN and request.args.get("token") != config.METRICS_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    body, content_type = metrics.render()
+    return app.response_class(body, content_type=content_type)
+
+
 @app.route("/healthz")
 def healthz():
     return jsonify({"status": "ok"})
@@ -430,15 +1430,8 @@ def warm_cache():
     """Warm up the cache for all workers by fetching today's menus."""
     try:
         date_str = datetime.now().strftime("%Y-%m-%d")
-        menus = fetch_all_menus(date_str)
-        
-        # Store in cache (thread-safe)
-        with CACHE_LOCK:
-            CACHE[date_str] = {
-                "data": menus,
-                "timestamp": datetime.now()
-            }
-            CACHE.move_to_end(date_str)
+        cached = cache_lookup(date_str)
+        menus = cached["data"] if cached else get_menus_single_flight(date_str)
         
         return jsonify({
             "status": "success", 
@@ -477,6 +1470,36 @@ def readyz():
 
     return jsonify(info)
 
+@app.cli.command("backfill-menus")
+@click.argument("start_date")
+@click.argument("end_date", required=False)
+@click.option("--force", is_flag=True, help="Refetch dates that already have a snapshot.")
+def backfill_menus_command(start_date, end_date, force):
+    """Fetches and snapshots menus for START_DATE through END_DATE."""
+    day = datetime.strptime(start_date, "%Y-%m-%d")
+    last = datetime.strptime(end_date or start_date, "%Y-%m-%d")
+    fetched = {}  # Every day of each week fetched so far
+    while day <= last:
+        date_str = day.strftime("%Y-%m-%d")
+        if date_str not in fetched and not force and database.get_menu_snapshot(date_str):
+            click.echo(f"{date_str}: snapshot exists, skipping")
+        else:
+            if date_str not in fetched:
+                week, complete = fetch_week_menus(date_str)
+                timestamp = datetime.now()
+                for day_str, day_menus in week.items():
+                    cache_store(day_str, day_menus, timestamp, complete=complete)
+                if not complete:
+                    click.echo(f"{date_str}: a dining hall failed, not snapshotted")
+                    day += timedelta(days=1)
+                    continue
+                fetched.update(week)
+            menus = fetched[date_str]
+            items = sum(len(items) for hall in menus.values() for meal in hall.values() for items in meal.values())
+            click.echo(f"{date_str}: {items} items")
+        day += timedelta(days=1)
+
+
 if __name__ == "__main__":
     database.create_tables()
     app.run(debug=True, port=8000)
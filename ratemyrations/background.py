@@ -0,0 +1,35 @@
+"""
+Per-process background threads.
+
+Threads do not survive fork(), so a thread started in the Gunicorn master
+is gone in every worker. ProcessThread remembers which process started it
+so each worker can start its own on first use.
+"""
+
+import os
+import threading
+
+
+class ProcessThread:
+    """A daemon thread started at most once per process."""
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._thread = None
+        self._pid = None
+
+    def started_here(self):
+        """True once start() has been called in this process."""
+        return self._pid == os.getpid()
+
+    def is_alive(self):
+        return self.started_here() and self._thread.is_alive()
+
+    def start(self):
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
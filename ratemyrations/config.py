@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 
 # Rate limiting - More generous limits for normal user interaction
 RATE_LIMIT_DEFAULT = os.environ.get("RATE_LIMIT_DEFAULT", "60 per minute")
@@ -9,13 +10,87 @@ ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 if not ADMIN_TOKEN:
     raise ValueError("ADMIN_TOKEN environment variable must be set for security")
 ENABLE_DELETE_RATINGS = os.environ.get("ENABLE_DELETE_RATINGS", "false").lower() == "true"
+# Largest page the admin ratings API returns
+ADMIN_RATINGS_MAX_PAGE_SIZE = int(os.environ.get("ADMIN_RATINGS_MAX_PAGE_SIZE", "500"))
 
 # Caching
+# Menus younger than CACHE_MINUTES are fresh; up to CACHE_HARD_MINUTES they are
+# served immediately while a background refresh runs (stale-while-revalidate)
 CACHE_MINUTES = int(os.environ.get("CACHE_MINUTES", "30"))
+CACHE_HARD_MINUTES = int(os.environ.get("CACHE_HARD_MINUTES", "240"))
 CACHE_MAX_SIZE = int(os.environ.get("CACHE_MAX_SIZE", "64"))
+# Host-wide menu cache in the SQLite database, shared by all Gunicorn workers
+SHARED_CACHE_ENABLED = os.environ.get("SHARED_CACHE_ENABLED", "true").lower() == "true"
+SHARED_CACHE_MAX_SIZE = int(os.environ.get("SHARED_CACHE_MAX_SIZE", "256"))
+# How long one worker may hold the right to fetch a date before others retry
+MENU_FETCH_LEASE_SECONDS = int(os.environ.get("MENU_FETCH_LEASE_SECONDS", "30"))
+# Persist fetched menus per date; past dates are then served without refetching
+MENU_SNAPSHOTS_ENABLED = os.environ.get("MENU_SNAPSHOTS_ENABLED", "true").lower() == "true"
+# How long requests wait on another request's in-flight fetch for the same date
+MENU_FETCH_WAIT_SECONDS = int(os.environ.get("MENU_FETCH_WAIT_SECONDS", "20"))
+
+# Rating ingestion: "sync" writes each rating in its own transaction,
+# "queued" group-commits ratings from a background writer per worker
+RATE_INGEST_MODE = os.environ.get("RATE_INGEST_MODE", "sync").lower()
+RATE_INGEST_FLUSH_MS = int(os.environ.get("RATE_INGEST_FLUSH_MS", "2"))
+RATE_INGEST_BATCH_SIZE = int(os.environ.get("RATE_INGEST_BATCH_SIZE", "200"))
+RATE_INGEST_ACK_TIMEOUT = float(os.environ.get("RATE_INGEST_ACK_TIMEOUT", "5"))
+
+# Most ratings accepted in one /api/rate/batch request
+RATE_BATCH_MAX_ITEMS = int(os.environ.get("RATE_BATCH_MAX_ITEMS", "100"))
+
+# Live rating updates over Server-Sent Events (/api/stream). Each open stream
+# holds a worker thread, so enable only with threaded workers (gthread)
+SSE_ENABLED = os.environ.get("SSE_ENABLED", "false").lower() == "true"
+# How often each worker checks the database for ratings from other workers
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "1"))
+SSE_HEARTBEAT_SECONDS = int(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+# Streams are closed after this long; browsers reconnect and replay missed events
+SSE_MAX_STREAM_SECONDS = int(os.environ.get("SSE_MAX_STREAM_SECONDS", "300"))
+# Threads per Gunicorn worker (start.sh passes this to --threads). Streams
+# are capped below it so a quarter of the threads stay free for ordinary
+# requests; a stream over the cap gets 503 instead of starving them
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", "32"))
+SSE_MAX_CLIENTS = int(os.environ.get("SSE_MAX_CLIENTS", max(1, GUNICORN_THREADS - max(1, GUNICORN_THREADS // 4))))
+if SSE_ENABLED and SSE_MAX_CLIENTS >= GUNICORN_THREADS:
+    raise ValueError(
+        f"SSE_MAX_CLIENTS ({SSE_MAX_CLIENTS}) must be below GUNICORN_THREADS ({GUNICORN_THREADS})"
+    )
+# Changed foods a slow client may have pending before it is told to resync
+SSE_MAX_PENDING = int(os.environ.get("SSE_MAX_PENDING", "500"))
+
+# Prometheus metrics at /metrics (needs the prometheus_client package). Set
+# PROMETHEUS_MULTIPROC_DIR to aggregate across Gunicorn workers
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# If set, scrapes must pass ?token=METRICS_TOKEN
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
 
 # Date constraints
 MAX_DAYS_AHEAD = int(os.environ.get("MAX_DAYS_AHEAD", "14"))
+# Rating history (/api/foods/<id>/history, /api/halls/<hall>/history): the
+# range served when none is given, and the longest range allowed
+HISTORY_DEFAULT_DAYS = int(os.environ.get("HISTORY_DEFAULT_DAYS", "90"))
+HISTORY_MAX_DAYS = int(os.environ.get("HISTORY_MAX_DAYS", "366"))
+
+# Leaderboards (/api/leaderboard) rank foods by a Bayesian average: each food
+# counts LEADERBOARD_PRIOR_WEIGHT extra ratings at the prior mean (by default
+# the average rating in scope), so a dish needs several good ratings to lead
+LEADERBOARD_PRIOR_WEIGHT = float(os.environ.get("LEADERBOARD_PRIOR_WEIGHT", "5"))
+LEADERBOARD_PRIOR_MEAN = (
+    float(os.environ["LEADERBOARD_PRIOR_MEAN"]) if os.environ.get("LEADERBOARD_PRIOR_MEAN") else None
+)
+LEADERBOARD_MIN_RATINGS = int(os.environ.get("LEADERBOARD_MIN_RATINGS", "1"))
+LEADERBOARD_MAX_LIMIT = int(os.environ.get("LEADERBOARD_MAX_LIMIT", "100"))
+# First day of the current semester (YYYY-MM-DD) for window=semester; unset,
+# that window is the last SEMESTER_DAYS days
+SEMESTER_START = os.environ.get("SEMESTER_START") or None
+if SEMESTER_START:
+    datetime.strptime(SEMESTER_START, "%Y-%m-%d")  # ValueError on a bad date
+SEMESTER_DAYS = int(os.environ.get("SEMESTER_DAYS", "120"))
+
+# Food search (/api/search): results returned by default and at most
+SEARCH_DEFAULT_LIMIT = int(os.environ.get("SEARCH_DEFAULT_LIMIT", "20"))
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "50"))
 
 # API Configuration
 NUTRISLICE_BASE_URL = os.environ.get("NUTRISLICE_BASE_URL", "https://dininguiowa.api.nutrislice.com")
@@ -1,17 +1,317 @@
+import difflib
+import functools
+import re
 import sqlite3
 import os
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(BASE_DIR, "ratings.db")
+DB_FILE = os.environ.get("RATINGS_DB_FILE", os.path.join(BASE_DIR, "ratings.db"))
 
-def create_tables():
-    """Creates the database tables if they don't exist."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # SQLite pragmas for better concurrency on reads
-    c.execute("PRAGMA journal_mode=WAL")
-    c.execute("PRAGMA synchronous=NORMAL")
-    c.execute("PRAGMA busy_timeout=3000")
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "3000"))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "256"))
+# Rating change events kept for live streams (older ones are pruned on insert)
+RATING_EVENTS_KEEP = int(os.environ.get("RATING_EVENTS_KEEP", "5000"))
+# Ranked leaderboards kept per worker (one per window, hall, meal and prior)
+LEADERBOARD_CACHE_SIZE = int(os.environ.get("LEADERBOARD_CACHE_SIZE", "64"))
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections.
+
+    Pragmas are applied once when a connection is opened, and each connection
+    keeps its own prepared statement cache. A thread holds at most one
+    connection at a time (nested use shares it). The pool is emptied in a
+    forked child so Gunicorn workers never reuse the master's connections.
+    """
+
+    def __init__(self, db_file, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Connections inherited across fork() are dropped, never closed:
+        # closing them in the child could disturb the parent's locks.
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._idle = []
+        self._size = 0
+        self._pid = os.getpid()
+        self._stats = {"opened": 0, "reused": 0, "waits": 0, "timeouts": 0}
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def _acquire(self):
+        if self._pid != os.getpid():
+            self._reset()
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self._stats["timeouts"] += 1
+                        raise sqlite3.OperationalError("connection pool exhausted")
+            if self._idle:
+                self._stats["reused"] += 1
+                return self._idle.pop()
+            self._size += 1
+        try:
+            conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["opened"] += 1
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # Never hand out a connection with a half-finished transaction
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yields a pooled connection, rolling back on error."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def close_all(self):
+        """Closes idle connections (e.g. before deleting the database file)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "pid": self._pid,
+            }
+
+
+_POOL = ConnectionPool(DB_FILE)
+
+
+def get_connection():
+    """Returns a context manager yielding a pooled database connection."""
+    return _POOL.connection()
+
+
+def get_pool_stats():
+    """Returns connection pool counters for this process."""
+    return _POOL.stats()
+
+
+# Optional callbacks for metrics: query(function_name, seconds) after each
+# timed call and lock_retry() whenever a locked statement is retried
+_QUERY_OBSERVER = None
+_LOCK_RETRY_OBSERVER = None
+
+
+def set_observers(query=None, lock_retry=None):
+    """Installs (or with no arguments removes) the timing callbacks."""
+    global _QUERY_OBSERVER, _LOCK_RETRY_OBSERVER
+    _QUERY_OBSERVER = query
+    _LOCK_RETRY_OBSERVER = lock_retry
+
+
+def _timed(func):
+    """Reports how long each call takes to the query observer, if one is set."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        observer = _QUERY_OBSERVER
+        if observer is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observer(func.__name__, time.perf_counter() - start)
+    return wrapper
+
+
+def _execute_with_retry(c, sql, params=(), attempts=3):
+    """Executes a statement, retrying briefly while the database is locked.
+
+    A transaction that hit a lock error cannot take the write lock any more,
+    so it is rolled back first. Only a statement that began the transaction
+    is retried; after earlier statements the error is re-raised, as their
+    work went with the rollback.
+    """
+    conn = c.connection
+    for attempt in range(attempts):
+        started_transaction = not conn.in_transaction
+        try:
+            return c.execute(sql, params)
+        except sqlite3.OperationalError as e:
+            if "database is locked" not in str(e):
+                raise
+            conn.rollback()
+            if started_transaction and attempt < attempts - 1:
+                if _LOCK_RETRY_OBSERVER is not None:
+                    _LOCK_RETRY_OBSERVER()
+                time.sleep(0.1)
+                continue
+            raise
+
+
+# Normalize meal slugs like 'dinner-3' -> 'dinner'
+_MEAL_BASE_SQL = """
+    CASE
+        WHEN {meal} LIKE 'breakfast%' THEN 'breakfast'
+        WHEN {meal} LIKE 'lunch%' THEN 'lunch'
+        WHEN {meal} LIKE 'dinner%' THEN 'dinner'
+        ELSE {meal}
+    END"""
+
+_ROLLUP_COLUMNS = "rating_count, rating_sum, count_1, count_2, count_3, count_4, count_5"
+_ROLLUP_UPSERT_SET = ", ".join(
+    f"{col} = {col} + excluded.{col}" for col in _ROLLUP_COLUMNS.split(", ")
+)
+
+
+def _rollup_values(row, sign):
+    """SQL expressions for one rating row's contribution to a rollup."""
+    counts = ", ".join(f"{sign}({row}.rating = {value})" for value in range(1, 6))
+    return f"{sign}1, {sign}{row}.rating, {counts}"
+
+
+def _rollup_apply_sql(row, sign):
+    """Statements adding (sign '+') or removing (sign '-') a rating row."""
+    values = _rollup_values(row, sign)
+    return f"""
+        INSERT INTO daily_food_stats (date, food_id, {_ROLLUP_COLUMNS})
+        SELECT {row}.date, {row}.food_id, {values}
+        WHERE {row}.date IS NOT NULL
+        ON CONFLICT (date, food_id) DO UPDATE SET {_ROLLUP_UPSERT_SET};
+
+        INSERT INTO daily_group_stats (date, level, group_key, {_ROLLUP_COLUMNS})
+        SELECT {row}.date, g.level, g.group_key, {values}
+        FROM (
+            SELECT 'station' AS level, f.station || '_' || f.dining_hall AS group_key
+            FROM foods f WHERE f.id = {row}.food_id
+            UNION ALL
+            SELECT 'dining_hall', f.dining_hall FROM foods f WHERE f.id = {row}.food_id
+            UNION ALL
+            SELECT 'meal', f.dining_hall || '_' || {_MEAL_BASE_SQL.format(meal="f.meal")}
+            FROM foods f WHERE f.id = {row}.food_id
+        ) AS g
+        WHERE {row}.date IS NOT NULL
+        ON CONFLICT (date, level, group_key) DO UPDATE SET {_ROLLUP_UPSERT_SET};
+    """
+
+
+def _create_rollup_tables(c):
+    """Creates the per-date rating rollups and the triggers maintaining them.
+
+    Returns True if the rollup tables were newly created.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_food_stats'")
+    existed = c.fetchone() is not None
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS daily_food_stats (
+            date TEXT NOT NULL,
+            food_id INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            count_1 INTEGER NOT NULL DEFAULT 0,
+            count_2 INTEGER NOT NULL DEFAULT 0,
+            count_3 INTEGER NOT NULL DEFAULT 0,
+            count_4 INTEGER NOT NULL DEFAULT 0,
+            count_5 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, food_id)
+        ) WITHOUT ROWID
+    """)
+    # level is 'station', 'dining_hall' or 'meal'; group_key matches get_ratings keys
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS daily_group_stats (
+            date TEXT NOT NULL,
+            level TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            count_1 INTEGER NOT NULL DEFAULT 0,
+            count_2 INTEGER NOT NULL DEFAULT 0,
+            count_3 INTEGER NOT NULL DEFAULT 0,
+            count_4 INTEGER NOT NULL DEFAULT 0,
+            count_5 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, level, group_key)
+        ) WITHOUT ROWID
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_rollup_insert
+        AFTER INSERT ON ratings
+        BEGIN
+            {_rollup_apply_sql("NEW", "+")}
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_rollup_update
+        AFTER UPDATE OF food_id, rating, date ON ratings
+        BEGIN
+            {_rollup_apply_sql("OLD", "-")}
+            {_rollup_apply_sql("NEW", "+")}
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ratings_rollup_delete
+        AFTER DELETE ON ratings
+        BEGIN
+            {_rollup_apply_sql("OLD", "-")}
+        END
+    """)
+    return not existed
+
+
+def _migrate_baseline(c):
+    """Baseline schema"""
     c.execute("""
         CREATE TABLE IF NOT EXISTS foods (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -61,6 +361,14 @@ def create_tables():
         CREATE INDEX IF NOT EXISTS idx_foods_unique ON foods (name, station, dining_hall, meal)
     """
     )
+
+    # Admin console pagination: newest first on (timestamp, id), with
+    # one index per filter that can narrow the scan
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_timestamp_id ON ratings (timestamp, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_user_timestamp ON ratings (user_id, timestamp, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_food_timestamp ON ratings (food_id, timestamp, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_date_timestamp ON ratings (date, timestamp, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_foods_dining_hall ON foods (dining_hall)")
     
     # User management table
     c.execute("""
@@ -73,438 +381,1495 @@ def create_tables():
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
-    conn.commit()
-    conn.close()
 
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_banned ON users (user_id) WHERE is_banned")
 
-def add_food(name, station, dining_hall, meal):
-    """Adds a food item to the database and returns its ID."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # Retry on database is locked
-    for _ in range(3):
+    # Version counters that let each worker tell when an in-memory cache
+    # is out of date; the users triggers bump "bans" on every change
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    c.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('bans', 0)")
+    # INSERT OR REPLACE fires only the insert trigger, so it is unconditional
+    for trigger, event in (
+        ("trg_users_bans_insert", "INSERT"),
+        ("trg_users_bans_update", "UPDATE OF is_banned"),
+        ("trg_users_bans_delete", "DELETE"),
+    ):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON users
+            BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = 'bans';
+            END
+        """)
+
+    # Per-date change counter for ratings, used as the /api/ratings ETag
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS ratings_versions (
+            date TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    # Re-submitting the same rating rewrites the row; that is not a change
+    changed = ("WHEN OLD.rating IS NOT NEW.rating OR OLD.food_id IS NOT NEW.food_id"
+               " OR OLD.date IS NOT NEW.date")
+    for trigger, event, rows in (
+        ("trg_ratings_version_insert", "INSERT ON ratings", ("NEW",)),
+        ("trg_ratings_version_update", f"UPDATE OF food_id, rating, date ON ratings {changed}", ("OLD", "NEW")),
+        ("trg_ratings_version_delete", "DELETE ON ratings", ("OLD",)),
+    ):
+        bumps = "".join(f"""
+                INSERT INTO ratings_versions (date, version)
+                SELECT {row}.date, 1 WHERE {row}.date IS NOT NULL
+                ON CONFLICT (date) DO UPDATE SET version = version + 1;""" for row in rows)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event}
+            BEGIN{bumps}
+            END
+        """)
+
+    # Log of (date, food) rating changes, read by every worker's live
+    # stream poller; the insert trigger keeps only the newest events
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rating_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            food_id INTEGER NOT NULL
+        )
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rating_events_prune AFTER INSERT ON rating_events
+        BEGIN
+            DELETE FROM rating_events WHERE id <= NEW.id - {RATING_EVENTS_KEEP};
+        END
+    """)
+    for trigger, event, rows in (
+        ("trg_rating_events_insert", "INSERT ON ratings", ("NEW",)),
+        ("trg_rating_events_update", f"UPDATE OF food_id, rating, date ON ratings {changed}", ("OLD", "NEW")),
+        ("trg_rating_events_delete", "DELETE ON ratings", ("OLD",)),
+    ):
+        logs = "".join(f"""
+                INSERT INTO rating_events (date, food_id)
+                SELECT {row}.date, {row}.food_id WHERE {row}.date IS NOT NULL;""" for row in rows)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event}
+            BEGIN{logs}
+            END
+        """)
+
+    # Per-date rating rollups; backfill them the first time they are created
+    if _create_rollup_tables(c):
+        _rebuild_rollups(c)
+
+    # Menu cache shared by all workers on the host, plus fetch leases so
+    # only one worker fetches a given date from Nutrislice at a time
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS menu_cache (
+            date TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_menu_cache_accessed ON menu_cache (accessed_at)
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS menu_fetch_leases (
+            date TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+    # Last successfully fetched menus per date, kept across restarts
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS menu_snapshots (
+            date TEXT PRIMARY KEY,
+            payload BLOB NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    """)
+
+
+def _migrate_rating_per_date(c):
+    """One rating per user, food and date"""
+    # The old (food_id, user_id) index already kept these unique, so this
+    # cannot fail; it lets a food served on several days be rated each day
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_ratings_food_user_date
+        ON ratings (food_id, user_id, date)
+        WHERE user_id IS NOT NULL
+    """)
+    c.execute("DROP INDEX IF EXISTS ux_ratings_food_user")
+
+
+def _migrate_query_indexes(c):
+    """Covering index for per-date reads; drop redundant indexes"""
+    # Same columns as the UNIQUE constraint's own index
+    c.execute("DROP INDEX IF EXISTS idx_foods_unique")
+    # A prefix of idx_ratings_food_timestamp
+    c.execute("DROP INDEX IF EXISTS idx_ratings_food_id")
+    # A day's ratings grouped by food (raw aggregates, rollup rebuilds, the
+    # date-filtered admin summary) without touching the table
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ratings_date_food
+        ON ratings (date, food_id, rating, user_id)
+    """)
+
+
+def _migrate_history_indexes(c):
+    """Indexes for rating history by food and by group"""
+    # The rollups are keyed by date first; history reads one food or group
+    # across a date range
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_daily_food_stats_food
+        ON daily_food_stats (food_id, date)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_daily_group_stats_group
+        ON daily_group_stats (level, group_key, date)
+    """)
+
+
+def _migrate_food_search(c):
+    """Full-text search index over food names, stations and halls"""
+    # External content: the index holds only tokens and reads rows back
+    # from foods; the triggers keep it in step with every write to foods
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+            name, station, dining_hall,
+            content='foods', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    # A match in the name counts most, then the station, then the hall
+    c.execute("INSERT INTO foods_fts (foods_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')")
+    # Every distinct token, for prefix checks and spelling suggestions
+    c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts_vocab USING fts5vocab(foods_fts, row)")
+    columns = "name, station, dining_hall"
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_insert AFTER INSERT ON foods
+        BEGIN
+            INSERT INTO foods_fts (rowid, {columns})
+            VALUES (NEW.id, NEW.name, NEW.station, NEW.dining_hall);
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_update AFTER UPDATE OF {columns} ON foods
+        BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, OLD.name, OLD.station, OLD.dining_hall);
+            INSERT INTO foods_fts (rowid, {columns})
+            VALUES (NEW.id, NEW.name, NEW.station, NEW.dining_hall);
+        END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_delete AFTER DELETE ON foods
+        BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, OLD.name, OLD.station, OLD.dining_hall);
+        END
+    """)
+    c.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+
+
+# Schema migrations in the order they are applied. Each one runs in its own
+# transaction and is recorded in schema_version; never change a shipped
+# migration, append a new one instead.
+_MIGRATIONS = [
+    (1, _migrate_baseline),
+    (2, _migrate_rating_per_date),
+    (3, _migrate_query_indexes),
+    (4, _migrate_history_indexes),
+    (5, _migrate_food_search),
+]
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+
+@_timed
+def get_schema_version():
+    """Returns the newest applied migration (0 for a new or pre-versioning database)."""
+    with get_connection() as conn:
+        c = conn.cursor()
         try:
-            c.execute(
-                "INSERT OR IGNORE INTO foods (name, station, dining_hall, meal) VALUES (?, ?, ?, ?)",
-                (name, station, dining_hall, meal),
-            )
-            break
+            c.execute("SELECT MAX(version) FROM schema_version")
         except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
+            if "no such table" in str(e):
+                return 0
+            raise
+        row = c.fetchone()
+    return row[0] or 0
+
+
+@_timed
+def create_tables():
+    """Creates the schema or brings it up to date with the pending migrations.
+
+    Returns the versions applied (empty when the schema is current). Safe to
+    run from several processes at once: each migration takes the write lock
+    and re-checks schema_version first. Index builds hold that lock for their
+    duration; readers carry on under WAL, so run this before starting
+    workers (start.sh does) rather than from them.
+    """
+    if get_schema_version() >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for version, migration in _MIGRATIONS:
+            _execute_with_retry(c, "BEGIN IMMEDIATE")
+            c.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+            if c.fetchone():
+                conn.rollback()
                 continue
-            else:
-                raise
-    if c.rowcount:
-        food_id = c.lastrowid
-    else:
-        c.execute(
-            "SELECT id FROM foods WHERE name = ? AND station = ? AND dining_hall = ? AND meal = ?",
-            (name, station, dining_hall, meal),
+            migration(c)
+            c.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, migration.__doc__),
+            )
+            conn.commit()
+            applied.append(version)
+    return applied
+
+
+class _ForkSafeLock:
+    """Base for process-wide caches guarded by self._lock.
+
+    A forked child gets a fresh lock: a copy that another thread held at
+    fork time would never be released.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+
+class FoodIndex(_ForkSafeLock):
+    """Process-wide (name, station, dining_hall, meal) -> food id map.
+
+    Loaded from the foods table on first use. Food ids never change, so
+    entries stay valid for the life of the process (and across fork).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = None
+        self.hits = 0
+        self.misses = 0
+    def _load(self, c):
+        c.execute("SELECT name, station, dining_hall, meal, id FROM foods")
+        return {tuple(row[:4]): row[4] for row in c.fetchall()}
+
+    def lookup(self, c, keys):
+        """Returns ({key: id} for known keys, [unknown keys])."""
+        with self._lock:
+            if self._ids is None:
+                self._ids = self._load(c)
+            found, missing = {}, []
+            for key in keys:
+                food_id = self._ids.get(key)
+                if food_id is None:
+                    missing.append(key)
+                else:
+                    found[key] = food_id
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def update(self, ids):
+        with self._lock:
+            if self._ids is not None:
+                self._ids.update(ids)
+
+    def clear(self):
+        with self._lock:
+            self._ids = None
+
+    def stats(self):
+        with self._lock:
+            size = len(self._ids) if self._ids is not None else 0
+            return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+_FOOD_INDEX = FoodIndex()
+
+
+def get_food_index_stats():
+    """Returns food id index counters for this process."""
+    return _FOOD_INDEX.stats()
+
+
+def _upsert_foods(c, keys):
+    """Inserts any foods in keys that do not exist yet and returns {key: id}.
+
+    The whole set goes through a temp table, so this is two statements
+    against foods however many keys there are. The write lock is taken up
+    front: the inserts also write the search index, and a read transaction
+    upgraded to a write fails at once when another writer got in first.
+    """
+    if not c.connection.in_transaction:
+        _execute_with_retry(c, "BEGIN IMMEDIATE")
+    c.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS food_batch (
+            name TEXT NOT NULL,
+            station TEXT NOT NULL,
+            dining_hall TEXT NOT NULL,
+            meal TEXT NOT NULL
         )
-        row = c.fetchone()
-        food_id = row[0] if row else None
-    conn.commit()
-    conn.close()
-    return food_id
+    """)
+    c.execute("DELETE FROM temp.food_batch")
+    c.executemany(
+        "INSERT INTO temp.food_batch (name, station, dining_hall, meal) VALUES (?, ?, ?, ?)",
+        keys,
+    )
+    _execute_with_retry(
+        c,
+        """
+        INSERT OR IGNORE INTO foods (name, station, dining_hall, meal)
+        SELECT name, station, dining_hall, meal FROM temp.food_batch
+        """,
+    )
+    c.execute("""
+        SELECT f.name, f.station, f.dining_hall, f.meal, f.id
+        FROM temp.food_batch b
+        JOIN foods f
+          ON f.name = b.name AND f.station = b.station
+         AND f.dining_hall = b.dining_hall AND f.meal = b.meal
+    """)
+    ids = {tuple(row[:4]): row[4] for row in c.fetchall()}
+    c.execute("DELETE FROM temp.food_batch")
+    return ids
 
 
+@_timed
+def add_food(name, station, dining_hall, meal):
+    """Adds a food item to the database and returns its ID."""
+    return add_foods_batch([(name, station, dining_hall, meal)])[0]
+
+
+@_timed
 def add_foods_batch(foods_data):
-    """Adds multiple food items in batch for better performance."""
+    """Adds multiple food items in batch and returns their IDs in input order.
+
+    Known foods are answered from the in-memory index; only new ones touch
+    the database. New foods enter the search index (foods_fts) in the same
+    transaction, through the foods triggers.
+    """
     if not foods_data:
         return []
-    
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    food_ids = []
-    
-    # First, check which foods already exist
-    existing_foods = {}
-    for name, station, dining_hall, meal in foods_data:
-        c.execute(
-            "SELECT id FROM foods WHERE name = ? AND station = ? AND dining_hall = ? AND meal = ?",
-            (name, station, dining_hall, meal),
-        )
-        row = c.fetchone()
-        if row:
-            existing_foods[(name, station, dining_hall, meal)] = row[0]
-    
-    # Insert new foods
-    new_foods = []
-    for name, station, dining_hall, meal in foods_data:
-        if (name, station, dining_hall, meal) not in existing_foods:
-            new_foods.append((name, station, dining_hall, meal))
-    
-    if new_foods:
-        c.executemany(
-            "INSERT OR IGNORE INTO foods (name, station, dining_hall, meal) VALUES (?, ?, ?, ?)",
-            new_foods,
-        )
-    
-    # Get all food IDs in the same order as input
-    for name, station, dining_hall, meal in foods_data:
-        if (name, station, dining_hall, meal) in existing_foods:
-            food_ids.append(existing_foods[(name, station, dining_hall, meal)])
+
+    keys = list(dict.fromkeys(tuple(food) for food in foods_data))
+    with get_connection() as conn:
+        c = conn.cursor()
+        ids, missing = _FOOD_INDEX.lookup(c, keys)
+        if missing:
+            new_ids = _upsert_foods(c, missing)
+            conn.commit()
+            _FOOD_INDEX.update(new_ids)
+            ids.update(new_ids)
+    return [ids.get(tuple(food)) for food in foods_data]
+
+
+def _apply_rating(c, food_id, user_id, rating, date):
+    """Applies one rating change on cursor c without committing.
+
+    Returns "inserted", "updated", "deleted" or "unchanged".
+    """
+    if rating == 0:
+        if user_id is not None:
+            _execute_with_retry(
+                c,
+                "DELETE FROM ratings WHERE food_id = ? AND user_id = ? AND date = ?",
+                (food_id, user_id, date),
+            )
         else:
-            # Find the ID of the newly inserted food
-            c.execute(
-                "SELECT id FROM foods WHERE name = ? AND station = ? AND dining_hall = ? AND meal = ?",
-                (name, station, dining_hall, meal),
+            # Fallback: delete most recent if no user provided (legacy behavior)
+            _execute_with_retry(
+                c,
+                "DELETE FROM ratings WHERE id = (SELECT id FROM ratings WHERE food_id = ? AND date = ? ORDER BY timestamp DESC LIMIT 1)",
+                (food_id, date),
             )
-            row = c.fetchone()
-            food_ids.append(row[0] if row else None)
-    
-    conn.commit()
-    conn.close()
-    return food_ids
+        return "deleted" if c.rowcount else "unchanged"
 
+    if user_id is None:
+        # Legacy insert without user tracking
+        _execute_with_retry(
+            c,
+            "INSERT INTO ratings (food_id, rating, date) VALUES (?, ?, ?)",
+            (food_id, rating, date),
+        )
+        return "inserted"
 
+    # Rating ids only grow (AUTOINCREMENT), so an id above the previous
+    # high-water mark is a row the upsert inserted rather than updated
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ratings'")
+    row = c.fetchone()
+    high_water = row[0] if row else 0
+    _execute_with_retry(
+        c,
+        """
+        INSERT INTO ratings (food_id, user_id, rating, date) VALUES (?, ?, ?, ?)
+        ON CONFLICT (food_id, user_id, date) WHERE user_id IS NOT NULL
+        DO UPDATE SET rating = excluded.rating, timestamp = CURRENT_TIMESTAMP
+        RETURNING id
+        """,
+        (food_id, user_id, rating, date),
+    )
+    (rating_id,), = c.fetchall()
+    return "inserted" if rating_id > high_water else "updated"
+
+
+@_timed
 def add_rating(food_id, user_id, rating, date=None):
     """Upserts a per-user rating. If rating == 0, delete the user's rating."""
     if date is None:
         from datetime import datetime
         date = datetime.now().strftime("%Y-%m-%d")
     
-    
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    if rating == 0:
-        if user_id is not None:
-            for _ in range(3):
-                try:
-                    c.execute("DELETE FROM ratings WHERE food_id = ? AND user_id = ? AND date = ?", (food_id, user_id, date))
-                    break
-                except sqlite3.OperationalError as e:
-                    if "database is locked" in str(e):
-                        import time; time.sleep(0.1)
-                        continue
-                    else:
-                        raise
-        else:
-            # Fallback: delete most recent if no user provided (legacy behavior)
-            for _ in range(3):
-                try:
-                    c.execute(
-                        "DELETE FROM ratings WHERE id = (SELECT id FROM ratings WHERE food_id = ? AND date = ? ORDER BY timestamp DESC LIMIT 1)",
-                        (food_id, date),
-                    )
-                    break
-                except sqlite3.OperationalError as e:
-                    if "database is locked" in str(e):
-                        import time; time.sleep(0.1)
-                        continue
-                    else:
-                        raise
-    else:
-        if user_id is None:
-            # Legacy insert without user tracking
-            for _ in range(3):
-                try:
-                    c.execute("INSERT INTO ratings (food_id, rating, date) VALUES (?, ?, ?)", (food_id, rating, date))
-                    break
-                except sqlite3.OperationalError as e:
-                    if "database is locked" in str(e):
-                        import time; time.sleep(0.1)
-                        continue
-                    else:
-                        raise
-        else:
-            # Emulate upsert: try update first, then insert if no row updated
-            for _ in range(3):
-                try:
-                    c.execute(
-                        "UPDATE ratings SET rating = ?, timestamp = CURRENT_TIMESTAMP WHERE food_id = ? AND user_id = ? AND date = ?",
-                        (rating, food_id, user_id, date),
-                    )
-                    break
-                except sqlite3.OperationalError as e:
-                    if "database is locked" in str(e):
-                        import time; time.sleep(0.1)
-                        continue
-                    else:
-                        raise
-            if c.rowcount == 0:
-                for _ in range(3):
-                    try:
-                        c.execute(
-                            "INSERT OR IGNORE INTO ratings (food_id, user_id, rating, date) VALUES (?, ?, ?, ?)",
-                            (food_id, user_id, rating, date),
-                        )
-                        break
-                    except sqlite3.OperationalError as e:
-                        if "database is locked" in str(e):
-                            import time; time.sleep(0.1)
-                            continue
-                        else:
-                            raise
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        _apply_rating(conn.cursor(), food_id, user_id, rating, date)
+        conn.commit()
+
+
+@_timed
+def add_ratings_batch(ratings_data):
+    """Applies many (food_id, user_id, rating, date) ratings in one transaction.
+
+    Each entry follows add_rating semantics. Returns the per-entry outcome
+    ("inserted", "updated", "deleted" or "unchanged") in input order.
+    """
+    if not ratings_data:
+        return []
+
+    from datetime import datetime
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    with get_connection() as conn:
+        c = conn.cursor()
+        if not conn.in_transaction:
+            # Take the write lock up front rather than upgrading mid-batch
+            _execute_with_retry(c, "BEGIN IMMEDIATE")
+        results = [
+            _apply_rating(c, food_id, user_id, rating, date or today)
+            for food_id, user_id, rating, date in ratings_data
+        ]
+        conn.commit()
+    return results
+
+
+# Rollup rows recomputed from the raw ratings table, used to rebuild/check
+_FOOD_ROLLUP_SELECT = """
+    SELECT r.date AS date, r.food_id AS food_id,
+           COUNT(*) AS rating_count, SUM(r.rating) AS rating_sum,
+           SUM(r.rating = 1) AS count_1, SUM(r.rating = 2) AS count_2,
+           SUM(r.rating = 3) AS count_3, SUM(r.rating = 4) AS count_4,
+           SUM(r.rating = 5) AS count_5
+    FROM ratings r
+    WHERE r.date IS NOT NULL
+    GROUP BY r.date, r.food_id
+"""
+
+
+def _group_rollup_select(food_source):
+    """Aggregates food-level rollup rows from food_source into group rows."""
+    sums = ", ".join(f"SUM(s.{col})" for col in _ROLLUP_COLUMNS.split(", "))
+    meal_base = _MEAL_BASE_SQL.format(meal="f.meal")
+    return f"""
+        SELECT s.date, 'station', f.station || '_' || f.dining_hall, {sums}
+        FROM {food_source} s JOIN foods f ON f.id = s.food_id
+        GROUP BY s.date, f.station, f.dining_hall
+        UNION ALL
+        SELECT s.date, 'dining_hall', f.dining_hall, {sums}
+        FROM {food_source} s JOIN foods f ON f.id = s.food_id
+        GROUP BY s.date, f.dining_hall
+        UNION ALL
+        SELECT s.date, 'meal', f.dining_hall || '_' || {meal_base}, {sums}
+        FROM {food_source} s JOIN foods f ON f.id = s.food_id
+        GROUP BY s.date, f.dining_hall, {meal_base}
+    """
+
+
+def _rebuild_rollups(c):
+    _execute_with_retry(c, "DELETE FROM daily_food_stats")
+    c.execute("DELETE FROM daily_group_stats")
+    c.execute(f"INSERT INTO daily_food_stats (date, food_id, {_ROLLUP_COLUMNS}) {_FOOD_ROLLUP_SELECT}")
+    c.execute(
+        f"INSERT INTO daily_group_stats (date, level, group_key, {_ROLLUP_COLUMNS}) "
+        + _group_rollup_select("daily_food_stats")
+    )
+
+
+@_timed
+def rebuild_rollups():
+    """Recomputes the per-date rating rollups from the raw ratings table."""
+    with get_connection() as conn:
+        _rebuild_rollups(conn.cursor())
+        conn.commit()
+
+
+@_timed
+def check_rollups():
+    """Compares the rollups against the raw ratings table.
+
+    Returns the number of mismatched food-level and group-level rows.
+    """
+    columns = f"date, food_id, {_ROLLUP_COLUMNS}"
+    group_columns = f"date, level, group_key, {_ROLLUP_COLUMNS}"
+    stored_food = f"SELECT {columns} FROM daily_food_stats WHERE rating_count != 0"
+    stored_group = f"SELECT {group_columns} FROM daily_group_stats WHERE rating_count != 0"
+    expected_group = _group_rollup_select(f"({_FOOD_ROLLUP_SELECT})")
+    with get_connection() as conn:
+        c = conn.cursor()
+        mismatches = {}
+        for name, expected, stored in (
+            ("food_mismatches", _FOOD_ROLLUP_SELECT, stored_food),
+            ("group_mismatches", expected_group, stored_group),
+        ):
+            # Symmetric difference between recomputed and stored rows
+            c.execute(f"""
+                SELECT
+                    (SELECT COUNT(*) FROM (SELECT * FROM ({expected}) EXCEPT {stored}))
+                    + (SELECT COUNT(*) FROM ({stored} EXCEPT SELECT * FROM ({expected})))
+            """)
+            mismatches[name] = c.fetchone()[0]
+    return mismatches
+
+
+def _meal_base(meal):
+    """Python twin of _MEAL_BASE_SQL ('dinner-3' -> 'dinner')."""
+    lowered = meal.lower()
+    for base in ("breakfast", "lunch", "dinner"):
+        if lowered.startswith(base):
+            return base
+    return meal
+
+
+@_timed
+def get_ratings_from_raw(date=None):
+    """Aggregates a date's ratings straight from the ratings table.
+
+    Reads the day's (food, rating) counts once and derives the food, station,
+    dining hall and meal levels from them in a single pass. Used when the
+    rollup tables have not been created yet.
+    """
+    if date is None:
+        from datetime import datetime
+        date = datetime.now().strftime("%Y-%m-%d")
+
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT f.name, f.station, f.dining_hall, f.meal, r.rating, COUNT(*)
+            FROM ratings r
+            JOIN foods f ON f.id = r.food_id
+            WHERE r.date = ?
+            GROUP BY r.food_id, r.rating
+        """, (date,))
+        rows = c.fetchall()
+
+    # [rating_count, rating_sum] accumulators per level
+    foods, stations, dining_halls, meals = {}, {}, {}, {}
+    for name, station, dining_hall, meal, rating, count in rows:
+        key = f"{name}_{station}_{dining_hall}_{meal}"
+        food = foods.get(key)
+        if food is None:
+            food = foods[key] = [0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}]
+        food[0] += count
+        food[1] += rating * count
+        if rating in food[2]:
+            food[2][rating] = count
+        for totals, group_key in (
+            (stations, f"{station}_{dining_hall}"),
+            (dining_halls, dining_hall),
+            (meals, f"{dining_hall}_{_meal_base(meal)}"),
+        ):
+            group = totals.setdefault(group_key, [0, 0])
+            group[0] += count
+            group[1] += rating * count
+
+    def summarize(totals):
+        return {
+            key: {"avg_rating": value[1] / value[0], "rating_count": value[0]}
+            for key, value in totals.items()
+        }
+
+    food_ratings = summarize(foods)
+    for key, food in foods.items():
+        food_ratings[key]["dist"] = food[2]
+
+    return {
+        "foods": food_ratings,
+        "stations": summarize(stations),
+        "dining_halls": summarize(dining_halls),
+        "meals": summarize(meals),
+    }
 
 
+@_timed
 def get_ratings(date=None):
-    """Calculates and returns the average ratings for a specific date."""
+    """Returns the average ratings for a specific date from the rollup tables."""
     if date is None:
         from datetime import datetime
         date = datetime.now().strftime("%Y-%m-%d")
     
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    with get_connection() as conn:
+        c = conn.cursor()
 
-    # Food ratings - only for foods that have ratings on the given date
-    c.execute("""
-        SELECT f.name, f.station, f.dining_hall, f.meal, AVG(r.rating), COUNT(r.rating)
-        FROM foods f
-        JOIN ratings r ON f.id = r.food_id
-        WHERE r.date = ?
-        GROUP BY f.id
-    """, (date,))
-    food_ratings = {}
-    for row in c.fetchall():
-        key = f"{row[0]}_{row[1]}_{row[2]}_{row[3]}"
-        food_ratings[key] = {"avg_rating": row[4], "rating_count": row[5]}
-        
-
-    # Food rating distributions (1..5)
-    c.execute("""
-        SELECT f.name, f.station, f.dining_hall, f.meal, r.rating, COUNT(*)
-        FROM foods f
-        JOIN ratings r ON f.id = r.food_id
-        WHERE r.date = ?
-        GROUP BY f.id, r.rating
-    """, (date,))
-    distributions = {}
-    for row in c.fetchall():
-        key = f"{row[0]}_{row[1]}_{row[2]}_{row[3]}"
-        if key not in distributions:
-            distributions[key] = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        distributions[key][int(row[4])] = row[5]
-
-    # Merge distributions into food_ratings
-    for key, dist in distributions.items():
-        if key in food_ratings:
-            food_ratings[key]["dist"] = dist
-        else:
-            food_ratings[key] = {"avg_rating": 0, "rating_count": sum(dist.values()), "dist": dist}
+        # Food ratings and distributions (1..5) for foods rated on the given date
+        c.execute("""
+            SELECT f.name, f.station, f.dining_hall, f.meal,
+                   s.rating_count, s.rating_sum,
+                   s.count_1, s.count_2, s.count_3, s.count_4, s.count_5
+            FROM daily_food_stats s
+            JOIN foods f ON f.id = s.food_id
+            WHERE s.date = ? AND s.rating_count > 0
+        """, (date,))
+        food_ratings = {}
+        for row in c.fetchall():
+            key = f"{row[0]}_{row[1]}_{row[2]}_{row[3]}"
+            food_ratings[key] = {
+                "avg_rating": row[5] / row[4],
+                "rating_count": row[4],
+                "dist": {1: row[6], 2: row[7], 3: row[8], 4: row[9], 5: row[10]},
+            }
 
-    # Station ratings
-    c.execute("""
-        SELECT f.station, f.dining_hall, AVG(r.rating), COUNT(r.rating)
-        FROM foods f
-        JOIN ratings r ON f.id = r.food_id
-        WHERE r.date = ?
-        GROUP BY f.station, f.dining_hall
-    """, (date,))
-    station_ratings = {
-        f"{row[0]}_{row[1]}": {"avg_rating": row[2], "rating_count": row[3]}
-        for row in c.fetchall()
+        # Station, dining hall and meal ratings
+        c.execute("""
+            SELECT level, group_key, rating_count, rating_sum
+            FROM daily_group_stats
+            WHERE date = ? AND rating_count > 0
+        """, (date,))
+        groups = {"station": {}, "dining_hall": {}, "meal": {}}
+        for level, group_key, rating_count, rating_sum in c.fetchall():
+            groups[level][group_key] = {
+                "avg_rating": rating_sum / rating_count,
+                "rating_count": rating_count,
+            }
+
+    return {
+        "foods": food_ratings,
+        "stations": groups["station"],
+        "dining_halls": groups["dining_hall"],
+        "meals": groups["meal"],
     }
 
-    # Dining hall ratings
-    c.execute("""
-        SELECT f.dining_hall, AVG(r.rating), COUNT(r.rating)
-        FROM foods f
-        JOIN ratings r ON f.id = r.food_id
-        WHERE r.date = ?
-        GROUP BY f.dining_hall
-    """, (date,))
-    dining_hall_ratings = {
-        row[0]: {"avg_rating": row[1], "rating_count": row[2]} for row in c.fetchall()
+
+@_timed
+def get_food_ratings(date):
+    """Returns {food_id: {"avg_rating", "rating_count", "dist"}} for foods rated on a date."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT food_id, rating_count, rating_sum,
+                   count_1, count_2, count_3, count_4, count_5
+            FROM daily_food_stats
+            WHERE date = ? AND rating_count > 0
+        """, (date,))
+        rows = c.fetchall()
+
+    return {
+        row[0]: {
+            "avg_rating": row[2] / row[1],
+            "rating_count": row[1],
+            "dist": {1: row[3], 2: row[4], 3: row[5], 4: row[6], 5: row[7]},
+        }
+        for row in rows
     }
 
-    # Meal ratings (normalize slugs like 'dinner-3' -> 'dinner')
+
+def _history_day(row):
+    """Turns (date, rating_count, rating_sum, count_1..count_5) into a history point."""
+    return {
+        "date": row[0],
+        "avg_rating": row[2] / row[1],
+        "rating_count": row[1],
+        "dist": {1: row[3], 2: row[4], 3: row[5], 4: row[6], 5: row[7]},
+    }
+
+
+@_timed
+def get_food(food_id):
+    """Returns a food's id, name, station, dining_hall and meal, or None."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, name, station, dining_hall, meal FROM foods WHERE id = ?", (food_id,))
+        row = c.fetchone()
+    if row is None:
+        return None
+    return dict(zip(("id", "name", "station", "dining_hall", "meal"), row))
+
+
+@_timed
+def get_food_history(food_id, date_from, date_to):
+    """Returns a food's daily ratings from date_from to date_to, oldest first.
+
+    Read from the daily_food_stats rollup; days without ratings are left out.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT date, rating_count, rating_sum,
+                   count_1, count_2, count_3, count_4, count_5
+            FROM daily_food_stats
+            WHERE food_id = ? AND date BETWEEN ? AND ? AND rating_count > 0
+            ORDER BY date
+        """, (food_id, date_from, date_to))
+        rows = c.fetchall()
+    return [_history_day(row) for row in rows]
+
+
+@_timed
+def get_group_history(level, group_key, date_from, date_to):
+    """Returns a station, dining hall or meal's daily ratings, oldest first.
+
+    level and group_key are as in daily_group_stats (e.g. "dining_hall",
+    "Burge" or "meal", "Burge_lunch"); days without ratings are left out.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT date, rating_count, rating_sum,
+                   count_1, count_2, count_3, count_4, count_5
+            FROM daily_group_stats
+            WHERE level = ? AND group_key = ? AND date BETWEEN ? AND ? AND rating_count > 0
+            ORDER BY date
+        """, (level, group_key, date_from, date_to))
+        rows = c.fetchall()
+    return [_history_day(row) for row in rows]
+
+
+@_timed
+def get_ratings_range_version(date_from, date_to):
+    """Returns a number that changes whenever a rating between two dates does.
+
+    Per-date versions only grow, so their sum over the range does too.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT COALESCE(SUM(version), 0) FROM ratings_versions WHERE date BETWEEN ? AND ?",
+            (date_from, date_to),
+        )
+        return c.fetchone()[0]
+
+
+class LeaderboardCache(_ForkSafeLock):
+    """Process-wide LRU of fully ranked leaderboards.
+
+    Each entry remembers the rating version of its date range
+    (get_ratings_range_version) and is rebuilt once that moves, so a new
+    rating anywhere in the window invalidates it on every worker.
+    """
+
+    def __init__(self, max_entries=LEADERBOARD_CACHE_SIZE):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, board):
+        with self._lock:
+            self._entries[key] = (version, board)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_LEADERBOARD_CACHE = LeaderboardCache()
+
+
+def get_leaderboard_cache_stats():
+    """Returns leaderboard cache counters for this process."""
+    return _LEADERBOARD_CACHE.stats()
+
+
+def _rank_foods(date_from, date_to, dining_hall, meal, prior_weight, prior_mean, min_ratings):
+    """Ranks every food rated in the range by its Bayesian average.
+
+    score = (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count),
+    so foods with few ratings are pulled towards prior_mean. prior_mean
+    defaults to the average of all ratings in scope.
+    """
+    clauses = ["s.date BETWEEN ? AND ?"]
+    params = [date_from, date_to]
+    if dining_hall:
+        clauses.append("f.dining_hall = ?")
+        params.append(dining_hall)
+    if meal:
+        clauses.append(f"{_MEAL_BASE_SQL.format(meal='f.meal')} = ?")
+        params.append(meal)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT f.id, f.name, f.station, f.dining_hall, f.meal,
+                   SUM(s.rating_count), SUM(s.rating_sum)
+            FROM daily_food_stats s
+            JOIN foods f ON f.id = s.food_id
+            WHERE {" AND ".join(clauses)}
+            GROUP BY s.food_id
+            HAVING SUM(s.rating_count) > 0
+        """, params)
+        rows = c.fetchall()
+
+    if prior_mean is None:
+        total = sum(row[5] for row in rows)
+        prior_mean = sum(row[6] for row in rows) / total if total else None
+    foods = [
+        {
+            "id": food_id,
+            "name": name,
+            "station": station,
+            "dining_hall": hall,
+            "meal": food_meal,
+            "score": (prior_weight * prior_mean + rating_sum) / (prior_weight + count),
+            "avg_rating": rating_sum / count,
+            "rating_count": count,
+        }
+        for food_id, name, station, hall, food_meal, count, rating_sum in rows
+        if count >= min_ratings
+    ]
+    foods.sort(key=lambda food: (-food["score"], -food["rating_count"], food["name"]))
+    for rank, food in enumerate(foods, start=1):
+        food["rank"] = rank
+    return {"prior": {"mean": prior_mean, "weight": prior_weight}, "foods": foods}
+
+
+@_timed
+def get_leaderboard(date_from, date_to, dining_hall=None, meal=None, limit=10,
+                    prior_weight=5, prior_mean=None, min_ratings=1):
+    """Returns the top `limit` foods rated between two dates by smoothed score.
+
+    dining_hall and meal ("breakfast", "lunch" or "dinner") narrow the
+    scope. The full ranking comes from the daily rollups and is cached until
+    a rating in the range changes, so a cached read costs one version lookup
+    and the slice. Returns {"version", "prior", "foods", "total_foods"}.
+    """
+    # Version first: a change while ranking only makes the entry look older
+    version = get_ratings_range_version(date_from, date_to)
+    key = (date_from, date_to, dining_hall, meal, prior_weight, prior_mean, min_ratings)
+    board = _LEADERBOARD_CACHE.get(key, version)
+    if board is None:
+        board = _rank_foods(date_from, date_to, dining_hall, meal, prior_weight, prior_mean, min_ratings)
+        _LEADERBOARD_CACHE.put(key, version, board)
+    return {
+        "version": version,
+        "prior": board["prior"],
+        "foods": board["foods"][:limit],
+        "total_foods": len(board["foods"]),
+    }
+
+
+# Words looked at per search query
+_SEARCH_MAX_TERMS = 8
+
+
+def _search_terms(query):
+    """Splits a query into lowercase words without accents, as foods_fts tokenizes."""
+    folded = "".join(
+        ch for ch in unicodedata.normalize("NFKD", query.lower())
+        if not unicodedata.combining(ch)
+    )
+    return list(dict.fromkeys(re.findall(r"[^\W_]+", folded)))[:_SEARCH_MAX_TERMS]
+
+
+def _close_terms(c, term, n=3, cutoff=0.75):
+    """Indexed words spelled like term (same first letter, similar length)."""
     c.execute("""
-        SELECT 
-            f.dining_hall,
-            CASE
-                WHEN f.meal LIKE 'breakfast%' THEN 'breakfast'
-                WHEN f.meal LIKE 'lunch%' THEN 'lunch'
-                WHEN f.meal LIKE 'dinner%' THEN 'dinner'
-                ELSE f.meal
-            END AS meal_base,
-            AVG(r.rating),
-            COUNT(r.rating)
-        FROM foods f
-        JOIN ratings r ON f.id = r.food_id
-        WHERE r.date = ?
-        GROUP BY f.dining_hall, meal_base
-    """, (date,))
-    meal_ratings = {
-        f"{row[0]}_{row[1]}": {"avg_rating": row[2], "rating_count": row[3]}
-        for row in c.fetchall()
+        SELECT term FROM foods_fts_vocab
+        WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?
+    """, (term[0], term[0] + "\U0010ffff", len(term) - 2, len(term) + 2))
+    return difflib.get_close_matches(term, [row[0] for row in c.fetchall()], n, cutoff)
+
+
+@_timed
+def search_foods(query, limit=20, dining_hall=None, meal=None):
+    """Finds foods by name, station or dining hall, best match first.
+
+    Every word of the query must match, as a word prefix ("chick" finds
+    "Chicken"); single letters match whole words only. A word that starts
+    no indexed word is replaced by up to three similarly spelled ones,
+    which are reported in "suggestions". Each food comes with its all-time
+    avg_rating and rating_count (from the daily rollups; avg_rating is None
+    when unrated). Returns {"foods", "suggestions"}.
+    """
+    terms = _search_terms(query)
+    suggestions = {}
+    if not terms:
+        return {"foods": [], "suggestions": suggestions}
+
+    with get_connection() as conn:
+        c = conn.cursor()
+        groups = []
+        for term in terms:
+            if len(term) == 1:
+                # As a prefix one letter matches most of the catalog; take it
+                # as a whole word, and ignore it if no food has that word
+                c.execute("SELECT 1 FROM foods_fts_vocab WHERE term = ?", (term,))
+                if c.fetchone():
+                    groups.append(f'"{term}"')
+                continue
+            c.execute(
+                "SELECT 1 FROM foods_fts_vocab WHERE term >= ? AND term < ? LIMIT 1",
+                (term, term + "\U0010ffff"),
+            )
+            if c.fetchone():
+                groups.append(f'"{term}"*')
+                continue
+            close = _close_terms(c, term)
+            suggestions[term] = close
+            if not close:
+                # No food can match every word
+                return {"foods": [], "suggestions": suggestions}
+            groups.append("(" + " OR ".join(f'"{word}"' for word in close) + ")")
+
+        if not groups:
+            return {"foods": [], "suggestions": suggestions}
+        clauses = ["foods_fts MATCH ?"]
+        params = [" AND ".join(groups)]
+        if dining_hall:
+            clauses.append("f.dining_hall = ?")
+            params.append(dining_hall)
+        if meal:
+            clauses.append(f"{_MEAL_BASE_SQL.format(meal='f.meal')} = ?")
+            params.append(meal)
+        params.append(limit)
+        # Rank and cut first, then total the ratings of the few foods left
+        c.execute(f"""
+            SELECT h.id, h.name, h.station, h.dining_hall, h.meal,
+                   SUM(s.rating_count), SUM(s.rating_sum)
+            FROM (
+                SELECT f.id, f.name, f.station, f.dining_hall, f.meal, foods_fts.rank AS rank
+                FROM foods_fts
+                JOIN foods f ON f.id = foods_fts.rowid
+                WHERE {" AND ".join(clauses)}
+                ORDER BY foods_fts.rank
+                LIMIT ?
+            ) h
+            LEFT JOIN daily_food_stats s ON s.food_id = h.id
+            GROUP BY h.id
+            ORDER BY MIN(h.rank)
+        """, params)
+        rows = c.fetchall()
+
+    foods = [
+        {
+            "id": food_id,
+            "name": name,
+            "station": station,
+            "dining_hall": hall,
+            "meal": food_meal,
+            "avg_rating": rating_sum / count if count else None,
+            "rating_count": count or 0,
+        }
+        for food_id, name, station, hall, food_meal, count, rating_sum in rows
+    ]
+    return {"foods": foods, "suggestions": suggestions}
+
+
+_ADMIN_RATINGS_SELECT = """
+    SELECT r.id, r.user_id, r.rating, r.date, r.timestamp,
+           f.name, f.station, f.dining_hall, f.meal,
+           u.nickname, u.is_banned
+    FROM ratings r
+    JOIN foods f ON r.food_id = f.id
+    LEFT JOIN users u ON r.user_id = u.user_id
+"""
+
+
+def _admin_rating(row):
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "rating": row[2],
+        "date": row[3],
+        "timestamp": row[4],
+        "food_name": row[5],
+        "station": row[6],
+        "dining_hall": row[7],
+        "meal": row[8],
+        "nickname": row[9],
+        "is_banned": bool(row[10]) if row[10] is not None else False
     }
 
-    conn.close()
 
+def _rating_filters(user_id=None, food_id=None, q=None, dining_hall=None,
+                    date_from=None, date_to=None, banned=None):
+    """Builds WHERE clauses (over ratings r and foods f) for the admin filters."""
+    clauses, params = [], []
+    if user_id:
+        clauses.append("r.user_id = ?")
+        params.append(user_id)
+    if food_id is not None:
+        clauses.append("r.food_id = ?")
+        params.append(food_id)
+    if q:
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append(
+            "(f.name LIKE ? ESCAPE '\\' OR f.station LIKE ? ESCAPE '\\' OR f.dining_hall LIKE ? ESCAPE '\\')"
+        )
+        params.extend([pattern] * 3)
+    if dining_hall:
+        clauses.append("f.dining_hall = ?")
+        params.append(dining_hall)
+    if date_from:
+        clauses.append("r.date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("r.date <= ?")
+        params.append(date_to)
+    if banned is True:
+        clauses.append("r.user_id IN (SELECT user_id FROM users WHERE is_banned)")
+    elif banned is False:
+        clauses.append("(r.user_id IS NULL OR r.user_id NOT IN (SELECT user_id FROM users WHERE is_banned))")
+    return clauses, params
+
+
+@_timed
+def get_ratings_version(date):
+    """Returns how many times a date's ratings have changed."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT version FROM ratings_versions WHERE date = ?", (date,))
+        row = c.fetchone()
+    return row[0] if row else 0
+
+
+@_timed
+def get_last_rating_event_id():
+    """Returns the id of the newest rating change event (0 if there are none)."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MAX(id) FROM rating_events")
+        row = c.fetchone()
+    return row[0] or 0
+
+
+@_timed
+def get_first_rating_event_id():
+    """Returns the id of the oldest rating change event still kept (0 if there are none)."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MIN(id) FROM rating_events")
+        row = c.fetchone()
+    return row[0] or 0
+
+
+def _rating_change(row):
+    """Turns (date, food_id, rating_count, rating_sum, count_1..count_5) into a change."""
     return {
-        "foods": food_ratings,
-        "stations": station_ratings,
-        "dining_halls": dining_hall_ratings,
-        "meals": meal_ratings,
+        "date": row[0],
+        "food_id": row[1],
+        "avg_rating": row[3] / row[2] if row[2] else 0,
+        "rating_count": row[2],
+        "dist": {1: row[4], 2: row[5], 3: row[6], 4: row[7], 5: row[8]},
     }
 
 
+@_timed
+def get_rating_changes(after_id, date=None):
+    """Returns (last_id, changes) for rating events newer than after_id.
+
+    changes holds the current ratings of each changed (date, food) as dicts
+    with date, food_id, avg_rating, rating_count and dist, so replaying an
+    event twice is harmless. A food whose last rating was removed comes back
+    with a rating_count of 0.
+    """
+    params = [after_id]
+    date_filter = ""
+    if date is not None:
+        date_filter = "AND e.date = ?"
+        params.append(date)
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT e.date, e.food_id, MAX(e.id),
+                   COALESCE(s.rating_count, 0), COALESCE(s.rating_sum, 0),
+                   COALESCE(s.count_1, 0), COALESCE(s.count_2, 0), COALESCE(s.count_3, 0),
+                   COALESCE(s.count_4, 0), COALESCE(s.count_5, 0)
+            FROM rating_events e
+            LEFT JOIN daily_food_stats s ON s.date = e.date AND s.food_id = e.food_id
+            WHERE e.id > ? {date_filter}
+            GROUP BY e.date, e.food_id
+        """, params)
+        rows = c.fetchall()
+
+    changes = [_rating_change(row[:2] + row[3:]) for row in rows]
+    return max((row[2] for row in rows), default=after_id), changes
+
+
+@_timed
+def get_food_day_ratings(keys):
+    """Returns the current ratings of each (date, food_id) in keys.
+
+    Entries are shaped like get_rating_changes() changes, in input order;
+    an unrated food has a rating_count of 0.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        rows = []
+        for date, food_id in keys:
+            c.execute(f"""
+                SELECT {_ROLLUP_COLUMNS}
+                FROM daily_food_stats
+                WHERE date = ? AND food_id = ?
+            """, (date, food_id))
+            rows.append((date, food_id) + (c.fetchone() or (0,) * 7))
+    return [_rating_change(row) for row in rows]
+
+
+@_timed
 def get_all_ratings():
     """Gets all ratings with food details for admin console."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(_ADMIN_RATINGS_SELECT + " ORDER BY r.timestamp DESC")
+        ratings = [_admin_rating(row) for row in c.fetchall()]
     
-    c.execute("""
-        SELECT r.id, r.user_id, r.rating, r.date, r.timestamp,
-               f.name, f.station, f.dining_hall, f.meal,
-               u.nickname, u.is_banned
+    return ratings
+
+
+@_timed
+def get_ratings_page(limit=100, cursor=None, **filters):
+    """Gets one page of ratings for the admin console, newest first.
+
+    cursor is the (timestamp, id) of the last rating on the previous page.
+    Returns (ratings, next_cursor); next_cursor is None on the last page.
+    Filters are the keyword arguments of _rating_filters.
+    """
+    clauses, params = _rating_filters(**filters)
+    if cursor:
+        clauses.append("(r.timestamp, r.id) < (?, ?)")
+        params.extend(cursor)
+    sql = _ADMIN_RATINGS_SELECT
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY r.timestamp DESC, r.id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+
+    ratings = [_admin_rating(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = ratings[-1]
+        next_cursor = (last["timestamp"], last["id"])
+    return ratings, next_cursor
+
+
+def iter_ratings(batch_size=1000, **filters):
+    """Yields every rating matching the filters, oldest id first.
+
+    Rows are read in keyset batches on id. Each batch uses a connection only
+    briefly, so a slow consumer never pins a pooled connection or an old
+    WAL snapshot. Memory stays at one batch however large the table is.
+    """
+    clauses, params = _rating_filters(**filters)
+    clauses.append("r.id > ?")
+    sql = (_ADMIN_RATINGS_SELECT + " WHERE " + " AND ".join(clauses)
+           + " ORDER BY r.id LIMIT ?")
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute(sql, params + [last_id, batch_size])
+            rows = c.fetchall()
+        for row in rows:
+            yield _admin_rating(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+
+@_timed
+def get_ratings_summary(**filters):
+    """Counts ratings, distinct foods and distinct users matching the filters."""
+    clauses, params = _rating_filters(**filters)
+    sql = """
+        SELECT COUNT(*), COUNT(DISTINCT r.food_id), COUNT(DISTINCT r.user_id)
         FROM ratings r
         JOIN foods f ON r.food_id = f.id
-        LEFT JOIN users u ON r.user_id = u.user_id
-        ORDER BY r.timestamp DESC
-    """)
-    
-    ratings = []
-    for row in c.fetchall():
-        ratings.append({
-            "id": row[0],
-            "user_id": row[1],
-            "rating": row[2],
-            "date": row[3],
-            "timestamp": row[4],
-            "food_name": row[5],
-            "station": row[6],
-            "dining_hall": row[7],
-            "meal": row[8],
-            "nickname": row[9],
-            "is_banned": bool(row[10]) if row[10] is not None else False
-        })
-    
-    conn.close()
-    return ratings
+    """
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        total, foods, users = c.fetchone()
+    return {"total_ratings": total, "unique_foods": foods, "unique_users": users}
 
 
+@_timed
 def update_user_nickname(user_id, nickname):
     """Updates or creates a user nickname."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    for _ in range(3):
-        try:
-            c.execute("""
-                INSERT OR REPLACE INTO users (user_id, nickname, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            """, (user_id, nickname))
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
-                continue
-            else:
-                raise
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, """
+            INSERT OR REPLACE INTO users (user_id, nickname, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        """, (user_id, nickname))
+        conn.commit()
 
 
+@_timed
 def ban_user(user_id, ban_reason=""):
     """Bans a user."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    for _ in range(3):
-        try:
-            c.execute("""
-                INSERT OR REPLACE INTO users (user_id, is_banned, ban_reason, updated_at)
-                VALUES (?, TRUE, ?, CURRENT_TIMESTAMP)
-            """, (user_id, ban_reason))
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
-                continue
-            else:
-                raise
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, """
+            INSERT OR REPLACE INTO users (user_id, is_banned, ban_reason, updated_at)
+            VALUES (?, TRUE, ?, CURRENT_TIMESTAMP)
+        """, (user_id, ban_reason))
+        conn.commit()
 
 
+@_timed
 def unban_user(user_id):
     """Unbans a user."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    for _ in range(3):
-        try:
-            c.execute("""
-                UPDATE users 
-                SET is_banned = FALSE, ban_reason = NULL, updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-            """, (user_id,))
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
-                continue
-            else:
-                raise
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, """
+            UPDATE users 
+            SET is_banned = FALSE, ban_reason = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ?
+        """, (user_id,))
+        conn.commit()
+
+
+# Hits refresh a cache entry's LRU timestamp at most this often
+_MENU_CACHE_TOUCH_SECONDS = 60
 
 
+@_timed
+def get_cached_menu(date):
+    """Returns (payload, fetched_at) from the shared menu cache, or None.
+
+    fetched_at is a Unix timestamp; expiry is left to the caller.
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT payload, fetched_at, accessed_at FROM menu_cache WHERE date = ?", (date,)
+        )
+        row = c.fetchone()
+        now = time.time()
+        if row and now - row[2] > _MENU_CACHE_TOUCH_SECONDS:
+            # LRU bookkeeping; skip rather than wait if another worker is
+            # writing (with the pool's busy timeout a hit could take seconds)
+            c.execute("PRAGMA busy_timeout=0")
+            try:
+                c.execute(
+                    "UPDATE menu_cache SET accessed_at = ? WHERE date = ?", (now, date)
+                )
+                conn.commit()
+            except sqlite3.OperationalError:
+                conn.rollback()
+            finally:
+                c.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return (row[0], row[1]) if row else None
+
+
+@_timed
+def put_cached_menu(date, payload, fetched_at, max_entries):
+    """Stores a serialized menu in the shared cache, evicting least recently used."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, """
+            INSERT OR REPLACE INTO menu_cache (date, payload, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?)
+        """, (date, payload, fetched_at, time.time()))
+        c.execute("""
+            DELETE FROM menu_cache WHERE date IN (
+                SELECT date FROM menu_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,))
+        conn.commit()
+
+
+@_timed
+def acquire_menu_fetch_lease(date, owner, ttl_seconds):
+    """Claims the right to fetch a date's menus. Returns True if acquired."""
+    now = time.time()
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(
+            c, "DELETE FROM menu_fetch_leases WHERE date = ? AND expires_at < ?", (date, now)
+        )
+        c.execute(
+            "INSERT OR IGNORE INTO menu_fetch_leases (date, owner, expires_at) VALUES (?, ?, ?)",
+            (date, owner, now + ttl_seconds),
+        )
+        acquired = c.rowcount > 0
+        conn.commit()
+    return acquired
+
+
+@_timed
+def get_menu_fetch_lease_expiry(date):
+    """Returns when the current lease on a date's menus expires, or None if unclaimed."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT expires_at FROM menu_fetch_leases WHERE date = ?", (date,))
+        row = c.fetchone()
+    return row[0] if row else None
+
+
+@_timed
+def release_menu_fetch_lease(date, owner):
+    """Releases a lease taken with acquire_menu_fetch_lease."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(
+            c, "DELETE FROM menu_fetch_leases WHERE date = ? AND owner = ?", (date, owner)
+        )
+        conn.commit()
+
+
+@_timed
+def get_menu_snapshot(date):
+    """Returns (payload, fetched_at) of the stored menu snapshot, or None."""
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT payload, fetched_at FROM menu_snapshots WHERE date = ?", (date,))
+        row = c.fetchone()
+    return (zlib.decompress(row[0]).decode("utf-8"), row[1]) if row else None
+
+
+@_timed
+def put_menu_snapshot(date, payload, fetched_at):
+    """Stores a serialized menu as the date's snapshot (zlib-compressed)."""
+    compressed = zlib.compress(payload.encode("utf-8"), 9)
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, """
+            INSERT OR REPLACE INTO menu_snapshots (date, payload, fetched_at)
+            VALUES (?, ?, ?)
+        """, (date, compressed, fetched_at))
+        conn.commit()
+
+
+class BanList(_ForkSafeLock):
+    """Process-wide set of banned user ids.
+
+    Each check reads the "bans" row of cache_versions, which the users
+    triggers bump on every change, and reloads the set only when it moved.
+    Bans made by any worker are therefore seen on the next check, and users
+    who are not banned never touch the users table.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._version = None
+        self._banned = frozenset()
+        self.reloads = 0
+    def contains(self, c, user_id):
+        c.execute("SELECT version FROM cache_versions WHERE name = 'bans'")
+        row = c.fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            if version != self._version:
+                c.execute("SELECT user_id FROM users WHERE is_banned")
+                self._banned = frozenset(row[0] for row in c.fetchall())
+                self._version = version
+                self.reloads += 1
+            return user_id in self._banned
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._banned = frozenset()
+
+    def stats(self):
+        with self._lock:
+            return {"version": self._version, "banned": len(self._banned), "reloads": self.reloads}
+
+
+_BAN_LIST = BanList()
+
+
+def get_ban_list_stats():
+    """Returns ban list counters for this process."""
+    return _BAN_LIST.stats()
+
+
+@_timed
 def is_user_banned(user_id):
     """Checks if a user is banned."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    c.execute("SELECT is_banned FROM users WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    conn.close()
-    
-    return bool(result[0]) if result else False
+    with get_connection() as conn:
+        return _BAN_LIST.contains(conn.cursor(), user_id)
 
 
+@_timed
 def delete_rating_by_id(rating_id):
     """Deletes a specific rating by ID."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    for _ in range(3):
-        try:
-            c.execute("DELETE FROM ratings WHERE id = ?", (rating_id,))
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
-                continue
-            else:
-                raise
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, "DELETE FROM ratings WHERE id = ?", (rating_id,))
+        conn.commit()
     return c.rowcount > 0
 
 
+@_timed
 def delete_all_ratings():
     """Deletes all ratings from the database."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    for _ in range(3):
-        try:
-            c.execute("DELETE FROM ratings")
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                import time; time.sleep(0.1)
-                continue
-            else:
-                raise
-    
-    conn.commit()
-    conn.close()
-    return c.rowcount
+    with get_connection() as conn:
+        c = conn.cursor()
+        _execute_with_retry(c, "DELETE FROM ratings")
+        deleted = c.rowcount
+        c.execute("DELETE FROM daily_food_stats")
+        c.execute("DELETE FROM daily_group_stats")
+        conn.commit()
+    return deleted
 
 
 if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "create-tables"
     create_tables()
-    print("Database tables created successfully.")
-
+    if command == "rebuild-rollups":
+        rebuild_rollups()
+        print("Rating rollups rebuilt.")
+    elif command == "check-rollups":
+        mismatches = check_rollups()
+        print(f"Rollup check: {mismatches}")
+        sys.exit(1 if any(mismatches.values()) else 0)
+    else:
+        print(f"Database schema is at version {get_schema_version()}.")
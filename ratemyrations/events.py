@@ -0,0 +1,188 @@
+"""
+Live rating updates for Server-Sent Events streams.
+
+Triggers on ratings append (date, food) rows to the rating_events table, so a
+commit in any Gunicorn worker on the host is visible to all of them. Each
+worker runs one poller thread (only while it has subscribers) that reads new
+events every SSE_POLL_SECONDS, looks up the current totals for the changed
+foods and hands them to that worker's subscribers for the date. Database
+reads therefore scale with workers, not with connected clients.
+
+Subscribers keep only the latest change per food, so a slow client costs at
+most one entry per food on the menu. If that still overflows, its pending
+changes are dropped and the client is told to resync.
+"""
+
+import threading
+
+from . import database
+from .background import ProcessThread
+
+
+class Subscription:
+    """Pending rating changes for one stream, coalesced per food."""
+
+    def __init__(self, date, max_pending):
+        self.date = date
+        self.max_pending = max_pending
+        self.last_event_id = 0
+        self.resync = False
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def push(self, event_id, changes):
+        """Queues changes; returns True if they overflowed into a resync."""
+        overflowed = False
+        with self._cond:
+            for change in changes:
+                self._pending[change["food_id"]] = change
+            if len(self._pending) > self.max_pending:
+                self._pending.clear()
+                self.resync = overflowed = True
+            self.last_event_id = max(self.last_event_id, event_id)
+            self._cond.notify()
+        return overflowed
+
+    def request_resync(self):
+        """Drops pending changes and tells the client to reload the day."""
+        with self._cond:
+            self._pending.clear()
+            self.resync = True
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Waits up to timeout for changes.
+
+        Returns (event_id, changes), ("resync", None) after an overflow, or
+        None if nothing arrived in time.
+        """
+        with self._cond:
+            if not self._pending and not self.resync:
+                self._cond.wait(timeout)
+            if self.resync:
+                self.resync = False
+                return "resync", None
+            if not self._pending:
+                return None
+            changes = list(self._pending.values())
+            self._pending.clear()
+            return self.last_event_id, changes
+
+
+class RatingBroadcaster:
+    """Per-worker fan-out of rating changes to stream subscribers."""
+
+    def __init__(self, poll_interval, max_clients, max_pending):
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers = {}
+        self._worker = ProcessThread(self._run, "rating-broadcaster")
+        self._last_id = 0
+        self._stats = {
+            "polls": 0,
+            "events_delivered": 0,
+            "rejected": 0,
+            "resyncs": 0,
+        }
+
+    def _ensure_started(self):
+        if self._worker.is_alive():
+            return
+        if not self._worker.started_here():
+            # Subscribers copied from the parent process are not ours
+            self._subscribers = {}
+        self._worker.start()
+
+    def subscribe(self, date, last_event_id=None):
+        """Registers a stream for a date; returns None when the worker is full."""
+        subscription = Subscription(date, self.max_pending)
+        # Read outside the lock so a slow database never holds up publishing
+        last_id = database.get_last_rating_event_id()
+        with self._lock:
+            if self._worker.started_here() and self.clients() >= self.max_clients:
+                self._stats["rejected"] += 1
+                return None
+            if not self._worker.started_here() or not self.clients():
+                # Start from the current end of the log
+                self._last_id = last_id
+            self._ensure_started()
+            self._subscribers.setdefault(date, set()).add(subscription)
+        self._wake.set()
+        if last_event_id is not None:
+            # Reconnecting client: replay what it missed from the log, or
+            # have it reload if part of that was already pruned
+            if last_event_id < database.get_first_rating_event_id() - 1:
+                subscription.request_resync()
+                with self._lock:
+                    self._stats["resyncs"] += 1
+                return subscription
+            event_id, changes = database.get_rating_changes(last_event_id, date)
+            for change in changes:
+                del change["date"]
+            if changes:
+                subscription.push(event_id, changes)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.date)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.date]
+
+    def notify(self):
+        """Polls right away, e.g. after this worker committed a rating."""
+        self._wake.set()
+
+    def clients(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _poll(self):
+        last_id, changes = database.get_rating_changes(self._last_id)
+        by_date = {}
+        for change in changes:
+            by_date.setdefault(change.pop("date"), []).append(change)
+        with self._lock:
+            self._last_id = last_id
+            self._stats["polls"] += 1
+            targets = [
+                (subscription, by_date[date])
+                for date, subscribers in self._subscribers.items()
+                if date in by_date
+                for subscription in subscribers
+            ]
+        resyncs = sum(
+            subscription.push(last_id, date_changes)
+            for subscription, date_changes in targets
+        )
+        with self._lock:
+            self._stats["events_delivered"] += len(targets)
+            self._stats["resyncs"] += resyncs
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # Nothing to deliver; sleep until someone subscribes
+                self._wake.wait()
+            else:
+                self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Rating broadcaster poll failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "clients": self.clients() if self._worker.started_here() else 0,
+                "dates": len(self._subscribers) if self._worker.started_here() else 0,
+                "last_event_id": self._last_id,
+            }
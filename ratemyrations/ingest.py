@@ -0,0 +1,195 @@
+"""
+Write-behind rating ingestion.
+
+Accepted ratings are queued in-process and a background writer applies them
+in batched transactions (group commit), flushing every RATE_INGEST_FLUSH_MS
+or once RATE_INGEST_BATCH_SIZE ratings are waiting. Callers wait on the
+returned ticket, which is only resolved after the batch containing their
+rating has committed.
+"""
+
+import queue
+import threading
+import time
+
+from . import database
+from .background import ProcessThread
+
+
+class RatingTicket:
+    """Acknowledgement for a queued rating, resolved once it is durable."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def _resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Returns True once the rating has been committed or has failed."""
+        return self._done.wait(timeout)
+
+
+class RatingWriter:
+    """Single background writer that group-commits queued ratings."""
+
+    def __init__(self, flush_interval_ms, batch_size):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = ProcessThread(self._run, "rating-writer")
+        self._stopping = False
+        self._stats = {
+            "submitted": 0,
+            "batches": 0,
+            "rows_written": 0,
+            "collapsed": 0,
+            "errors": 0,
+            "failed_rows": 0,
+            "largest_batch": 0,
+        }
+
+    def _ensure_started(self):
+        if self._worker.started_here() and (self._stopping or self._worker.is_alive()):
+            return
+        with self._lock:
+            if not self._worker.started_here():
+                # Ratings queued in the parent process are not ours to write
+                self._queue = queue.Queue()
+                self._stopping = False
+            elif self._stopping or self._worker.is_alive():
+                return
+            self._worker.start()
+
+    def submit(self, food_id, user_id, rating, date):
+        """Queues a rating and returns a RatingTicket for its commit."""
+        ticket = RatingTicket()
+        item = ((food_id, user_id, rating, date), ticket)
+        self._ensure_started()
+        # Checked under the lock so nothing is queued once stop() has begun
+        with self._lock:
+            stopping = self._stopping
+            if not stopping:
+                self._queue.put(item)
+            self._stats["submitted"] += 1
+        if stopping:
+            # The writer is shutting down; commit this rating inline
+            self._write([item])
+        return ticket
+
+    def _collect(self):
+        """Blocks for the first rating, then gathers a batch until full or due."""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drain without waiting when shutting down
+        while self._stopping and len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        # Last write wins for repeated (user, food, date) ratings in a batch
+        entries = []
+        tickets = []
+        positions = {}
+        for entry, ticket in batch:
+            food_id, user_id, _, date = entry
+            key = (user_id, food_id, date) if user_id is not None else None
+            if key is not None and key in positions:
+                index = positions[key]
+                entries[index] = entry
+                tickets[index].append(ticket)
+                continue
+            if key is not None:
+                positions[key] = len(entries)
+            entries.append(entry)
+            tickets.append([ticket])
+
+        try:
+            results = database.add_ratings_batch(entries)
+        except Exception as e:
+            # One bad row fails the whole transaction; apply the rows one at
+            # a time so only that row's callers see the error
+            print(f"Rating writer failed to commit {len(entries)} ratings, retrying one by one: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            results = []
+            for entry in entries:
+                try:
+                    results.append(database.add_ratings_batch([entry])[0])
+                except Exception as row_error:
+                    results.append(row_error)
+
+        failed = sum(isinstance(result, Exception) for result in results)
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["rows_written"] += len(entries) - failed
+            self._stats["failed_rows"] += failed
+            self._stats["collapsed"] += len(batch) - len(entries)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        for result, waiting in zip(results, tickets):
+            for ticket in waiting:
+                if isinstance(result, Exception):
+                    ticket._resolve(error=result)
+                else:
+                    ticket._resolve(result=result)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Keep the writer alive; nobody may be left waiting forever
+                    print(f"Rating writer dropped a batch of {len(batch)} ratings: {e}")
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    for _, ticket in batch:
+                        if not ticket.wait(0):
+                            ticket._resolve(error=e)
+            elif self._stopping and self._queue.empty():
+                return
+
+    def stop(self, timeout=10):
+        """Flushes everything queued so far and stops the writer thread."""
+        if not self._worker.started_here():
+            return
+        with self._lock:
+            self._stopping = True
+        self._worker.join(timeout)
+        # Commit whatever the writer did not reach before the timeout
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "queued": self._queue.qsize()}
+
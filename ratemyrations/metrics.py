@@ -0,0 +1,108 @@
+"""
+Prometheus metrics for /metrics.
+
+Needs the optional prometheus_client package; without it (or with
+METRICS_ENABLED=false) every recording function here is a no-op.
+
+Under Gunicorn each worker has its own counters, so set
+PROMETHEUS_MULTIPROC_DIR to an empty directory before starting: workers then
+write their samples there and /metrics adds them up across workers
+(gunicorn.conf.py cleans up after workers that exit). Without it, /metrics
+only reports the worker that served the scrape.
+"""
+
+import os
+
+from . import config
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+ENABLED = prometheus_client is not None and config.METRICS_ENABLED
+MULTIPROCESS = ENABLED and bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Menu fetches and most requests take milliseconds, Nutrislice up to seconds
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+if ENABLED:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        "ratemyrations_request_duration_seconds",
+        "Time to build a response, by route (streamed bodies not included)",
+        ["route", "method", "status"],
+        buckets=_LATENCY_BUCKETS,
+    )
+    MENU_CACHE = prometheus_client.Counter(
+        "ratemyrations_menu_cache_total",
+        "Menu lookups by outcome (fresh, revalidating, miss, stale, error)",
+        ["state"],
+    )
+    UPSTREAM_LATENCY = prometheus_client.Histogram(
+        "ratemyrations_nutrislice_request_duration_seconds",
+        "Nutrislice week menu request latency",
+        ["hall", "meal"],
+        buckets=_LATENCY_BUCKETS,
+    )
+    UPSTREAM_ERRORS = prometheus_client.Counter(
+        "ratemyrations_nutrislice_errors_total",
+        "Failed Nutrislice week menu fetches",
+        ["hall", "meal", "reason"],
+    )
+    DB_LATENCY = prometheus_client.Histogram(
+        "ratemyrations_db_call_duration_seconds",
+        "Time spent in database.py functions",
+        ["function"],
+        buckets=_DB_BUCKETS,
+    )
+    DB_LOCK_RETRIES = prometheus_client.Counter(
+        "ratemyrations_db_lock_retries_total",
+        "Statements retried because the database was locked",
+    )
+
+
+def observe_request(route, method, status, seconds):
+    if ENABLED:
+        REQUEST_LATENCY.labels(route, method, str(status)).observe(seconds)
+
+
+def count_menu_cache(state):
+    if ENABLED:
+        MENU_CACHE.labels(state).inc()
+
+
+def observe_upstream(hall, meal, seconds):
+    if ENABLED:
+        UPSTREAM_LATENCY.labels(hall, meal).observe(seconds)
+
+
+def count_upstream_error(hall, meal, reason):
+    if ENABLED:
+        UPSTREAM_ERRORS.labels(hall, meal, reason).inc()
+
+
+def observe_db(function, seconds):
+    DB_LATENCY.labels(function).observe(seconds)
+
+
+def count_db_lock_retry():
+    DB_LOCK_RETRIES.inc()
+
+
+def install_database_observers(database):
+    """Routes database.py timings and lock retries into these metrics."""
+    if ENABLED:
+        database.set_observers(query=observe_db, lock_retry=count_db_lock_retry)
+
+
+def render():
+    """Returns (body, content_type) for a scrape, summed across workers if configured."""
+    if MULTIPROCESS:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
@@ -14,6 +14,129 @@ document.addEventListener("DOMContentLoaded", function () {
     localStorage.setItem("browserId", browserId);
   }
 
+  // Star clicks are collected and sent together to /api/rate/batch once
+  // clicking pauses; only the last click per food and date is sent
+  const RATING_FLUSH_DELAY_MS = 600;
+  const RATING_BATCH_MAX = 50;
+  const pendingRatings = new Map();
+  let ratingFlushTimer = null;
+
+  function queueRating(foodId, rating, previous, view) {
+    const date = dateInput.value;
+    const key = `${date}:${foodId}`;
+    const pending = pendingRatings.get(key);
+    pendingRatings.set(key, {
+      food_id: foodId,
+      rating,
+      date,
+      // Keep the rating from before the first unsent click for reverting
+      previous: pending ? pending.previous : previous,
+      view,
+    });
+    clearTimeout(ratingFlushTimer);
+    if (pendingRatings.size >= RATING_BATCH_MAX) {
+      flushRatings();
+    } else {
+      ratingFlushTimer = setTimeout(flushRatings, RATING_FLUSH_DELAY_MS);
+    }
+  }
+
+  function ratingBatchBody(batch) {
+    return JSON.stringify({
+      user_id: browserId,
+      ratings: batch.map(({ food_id, rating, date }) => ({
+        food_id,
+        rating,
+        date,
+      })),
+    });
+  }
+
+  function flushRatings() {
+    clearTimeout(ratingFlushTimer);
+    ratingFlushTimer = null;
+    if (pendingRatings.size === 0) return;
+    const batch = Array.from(pendingRatings.values());
+    pendingRatings.clear();
+
+    fetch("/api/rate/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: ratingBatchBody(batch),
+    })
+      .then((response) => {
+        console.log(
+          "Rating batch response:",
+          response.status,
+          response.statusText,
+        );
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        return response.json();
+      })
+      .then((data) => {
+        const saved = [];
+        batch.forEach((item, i) => {
+          const result = data.results[i];
+          if (result && result.status !== "error") {
+            saved.push(item);
+          } else {
+            console.warn("Rating rejected:", item.food_id, result);
+            item.view.applyVisual(item.previous);
+          }
+        });
+        // Persist only what the server accepted
+        for (const item of saved) {
+          if (item.rating === 0) {
+            delete userRatings[item.food_id];
+          } else {
+            userRatings[item.food_id] = item.rating;
+          }
+        }
+        localStorage.setItem("userRatings", JSON.stringify(userRatings));
+        console.log(`Saved ${saved.length} of ${batch.length} ratings`);
+
+        // The response carries the new totals of the rated foods; apply
+        // them like live updates instead of refetching the whole day
+        try {
+          applyLiveRatings(
+            (data.ratings || []).filter(
+              (change) => change.date === dateInput.value,
+            ),
+          );
+        } catch (e) {
+          console.warn("Failed to apply ratings after submission:", e);
+        }
+      })
+      .catch((error) => {
+        console.error("Error updating ratings:", error);
+
+        // Handle rate limiting specifically
+        if (error.message.includes("HTTP 429")) {
+          alert(
+            "Rate limit exceeded. Please wait a moment before rating more items.",
+          );
+        } else {
+          alert("Failed to update rating. Please try again.");
+        }
+
+        // Revert the star selections to their previous state
+        batch.forEach((item) => item.view.applyVisual(item.previous));
+      });
+  }
+
+  // Send ratings still waiting for the debounce when the page is closed
+  window.addEventListener("pagehide", () => {
+    if (pendingRatings.size === 0 || !navigator.sendBeacon) return;
+    const batch = Array.from(pendingRatings.values());
+    pendingRatings.clear();
+    navigator.sendBeacon(
+      "/api/rate/batch",
+      new Blob([ratingBatchBody(batch)], { type: "application/json" }),
+    );
+  });
+
   const diningHallHours = {
     Burge: {
       Breakfast: { start: 7.5, end: 10.5 },
@@ -46,34 +169,6 @@ document.addEventListener("DOMContentLoaded", function () {
     return null;
   }
 
-  async function fetchRatings() {
-    console.log("Fetching ratings for date:", dateInput.value);
-    try {
-      const response = await fetch(`/api/ratings?date=${dateInput.value}`);
-      if (!response.ok) {
-        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-      }
-      const data_1 = await response.json();
-      console.log("Raw ratings data from backend:", data_1);
-      ratings = data_1;
-      return data_1;
-    } catch (error) {
-      console.error("Error fetching ratings:", error);
-
-      // Handle rate limiting specifically
-      if (error.message.includes("HTTP 429")) {
-        console.warn(
-          "Rate limited while fetching ratings, keeping existing data",
-        );
-        // Don't throw error for rate limiting - keep existing ratings
-        return ratings;
-      }
-
-      // Don't update ratings if fetch fails - keep existing data
-      throw error;
-    }
-  }
-
   function renderStars(rating, foodId, isInteractive = true) {
     const starRatingContainer = document.createElement("div");
     starRatingContainer.classList.add("star-rating-container");
@@ -130,89 +225,10 @@ document.addEventListener("DOMContentLoaded", function () {
           // Update visual state immediately using rated/user-rated classes
           applyVisual(newRating);
 
-          if (star.dataset._debouncing) return;
-          star.dataset._debouncing = "1";
-
-          // Add a small delay to prevent rapid-fire requests
-          setTimeout(() => {
-            if (!star.dataset._debouncing) return; // Check if still debouncing
-            fetch("/api/rate", {
-              method: "POST",
-              headers: { "Content-Type": "application/json" },
-              body: JSON.stringify({
-                food_id: foodId,
-                rating: newRating,
-                user_id: browserId,
-                date: dateInput.value,
-              }),
-            })
-              .then((response) => {
-                console.log(
-                  "Rating submission response:",
-                  response.status,
-                  response.statusText,
-                );
-                if (!response.ok) {
-                  throw new Error(
-                    `HTTP ${response.status}: ${response.statusText}`,
-                  );
-                }
-                return response.json();
-              })
-              .then((data) => {
-                console.log("Rating submission success:", data);
-                // Update userRatings immediately BEFORE any calculations
-                if (newRating === 0) {
-                  delete userRatings[foodId];
-                } else {
-                  userRatings[foodId] = newRating;
-                }
-                localStorage.setItem(
-                  "userRatings",
-                  JSON.stringify(userRatings),
-                );
-                console.log("Rating updated successfully");
-
-                // Fetch updated ratings from server to get accurate community data
-                fetchRatings()
-                  .then(() => {
-                    console.log("Refreshed ratings data after submission");
-                    // Update community display with fresh server data
-                    updateCommunityRatingDisplay(
-                      starRatingContainer,
-                      newRating,
-                    );
-                    // Force DOM to update, then calculate aggregates
-                    requestAnimationFrame(() => {
-                      updateLiveAggregates(starRatingContainer, newRating);
-                    });
-                  })
-                  .catch((e) => {
-                    console.warn(
-                      "Failed to refresh ratings after submission:",
-                      e,
-                    );
-                  });
-              })
-              .catch((error) => {
-                console.error("Error updating rating:", error);
-
-                // Handle rate limiting specifically
-                if (error.message.includes("HTTP 429")) {
-                  alert(
-                    "Rate limit exceeded. Please wait a moment before rating more items.",
-                  );
-                } else {
-                  alert("Failed to update rating. Please try again.");
-                }
-
-                // Revert the star selection to previous state
-                applyVisual(current);
-              })
-              .finally(() => {
-                delete star.dataset._debouncing;
-              });
-          }, 100); // 100ms delay to prevent rapid-fire requests
+          queueRating(foodId, newRating, current, {
+            container: starRatingContainer,
+            applyVisual,
+          });
         });
       });
 
@@ -239,158 +255,20 @@ document.addEventListener("DOMContentLoaded", function () {
     return starRatingContainer;
   }
 
-  function filterRatingsByMenu(ratings, menuData) {
-    // Handle malformed ratings data
-    if (!ratings || typeof ratings !== "object") {
-      return {
-        foods: {},
-        stations: {},
-        dining_halls: {},
-        meals: {},
-      };
-    }
-
-    // Ensure ratings has the expected structure
-    if (!ratings.foods) ratings.foods = {};
-    if (!ratings.stations) ratings.stations = {};
-    if (!ratings.dining_halls) ratings.dining_halls = {};
-    if (!ratings.meals) ratings.meals = {};
-
-    // Create a set of food keys that are in today's menu
-    const menuFoodKeys = new Set();
-    for (const diningHall in menuData) {
-      for (const meal in menuData[diningHall]) {
-        for (const station in menuData[diningHall][meal]) {
-          const items = menuData[diningHall][meal][station];
-          if (items && items.length > 0) {
-            for (const item of items) {
-              // Use the original meal slug from the menu data, not normalized display name
-              // We need to map back to the original meal slug used in the database
-              // I just wish the menu data was consistent
-              let originalMealSlug = meal;
-              if (diningHall === "Catlett") {
-                if (meal === "breakfast") originalMealSlug = "breakfast-2";
-                else if (meal === "lunch") originalMealSlug = "lunch-2";
-                else if (meal === "dinner") originalMealSlug = "dinner-2";
-              } else if (diningHall === "Hillcrest") {
-                if (meal === "breakfast") originalMealSlug = "breakfast-3";
-                else if (meal === "lunch") originalMealSlug = "lunch-3";
-                // dinner stays 'dinner' for Hillcrest
-              } else if (diningHall === "Burge") {
-                if (meal === "dinner") originalMealSlug = "dinner-3";
-                // breakfast and lunch stay the same for Burge. Obviously. Because of course they do.
-              }
-
-              const foodKey = `${item.name}_${station}_${diningHall}_${originalMealSlug}`;
-              menuFoodKeys.add(foodKey);
-            }
-          }
-        }
-      }
-    }
-
-    // Filter ratings to only include foods that are in the menu
-    const filteredRatings = {
-      foods: {},
-      stations: {},
-      dining_halls: {},
-      meals: {},
-    };
-
-    // Filter food ratings
-    for (const [foodKey, rating] of Object.entries(ratings.foods)) {
-      if (menuFoodKeys.has(foodKey)) {
-        filteredRatings.foods[foodKey] = rating;
-      }
-    }
-
-    // Recalculate station ratings based on filtered foods
-    const stationRatings = {};
-    for (const [foodKey, rating] of Object.entries(filteredRatings.foods)) {
-      const parts = foodKey.split("_");
-      const station = parts[1];
-      const diningHall = parts[2];
-      const meal = parts[3];
-      const stationKey = `${station}_${diningHall}_${meal}`;
-
-      if (!stationRatings[stationKey]) {
-        stationRatings[stationKey] = { total: 0, count: 0 };
-      }
-      stationRatings[stationKey].total +=
-        rating.avg_rating * rating.rating_count;
-      stationRatings[stationKey].count += rating.rating_count;
-    }
-
-    for (const [stationKey, data] of Object.entries(stationRatings)) {
-      if (data.count > 0) {
-        filteredRatings.stations[stationKey] = {
-          avg_rating: data.total / data.count,
-          rating_count: data.count,
-        };
-      }
-    }
-
-    // Recalculate dining hall ratings based on filtered foods
-    const diningHallRatings = {};
-    for (const [foodKey, rating] of Object.entries(filteredRatings.foods)) {
-      const parts = foodKey.split("_");
-      const diningHall = parts[2];
-
-      if (!diningHallRatings[diningHall]) {
-        diningHallRatings[diningHall] = { total: 0, count: 0 };
-      }
-      diningHallRatings[diningHall].total +=
-        rating.avg_rating * rating.rating_count;
-      diningHallRatings[diningHall].count += rating.rating_count;
-    }
-
-    for (const [diningHall, data] of Object.entries(diningHallRatings)) {
-      if (data.count > 0) {
-        filteredRatings.dining_halls[diningHall] = {
-          avg_rating: data.total / data.count,
-          rating_count: data.count,
-        };
-      }
-    }
-
-    // Recalculate meal ratings based on filtered foods
-    const mealRatings = {};
-    for (const [foodKey, rating] of Object.entries(filteredRatings.foods)) {
-      const parts = foodKey.split("_");
-      const diningHall = parts[2];
-      const meal = parts[3];
-      const mealKey = `${diningHall}_${meal}`;
-
-      if (!mealRatings[mealKey]) {
-        mealRatings[mealKey] = { total: 0, count: 0 };
-      }
-      mealRatings[mealKey].total += rating.avg_rating * rating.rating_count;
-      mealRatings[mealKey].count += rating.rating_count;
-    }
-
-    for (const [mealKey, data] of Object.entries(mealRatings)) {
-      if (data.count > 0) {
-        filteredRatings.meals[mealKey] = {
-          avg_rating: data.total / data.count,
-          rating_count: data.count,
-        };
-      }
-    }
-
-    return filteredRatings;
-  }
-
-  function fetchMenus(date, openTabs = new Set()) {
-    fetch(`/api/menus?date=${date}`)
+  function fetchDay(date, openTabs = new Set()) {
+    // Menus and ratings in one request; the server attaches each item's
+    // rating and aggregates stations, meals and halls over this menu only
+    fetch(`/api/day?date=${date}`)
       .then((response) => {
         if (!response.ok) {
           throw new Error("Network response was not ok");
         }
         return response.json();
       })
-      .then((data) => {
-        // Filter ratings to only include foods in today's menu
-        ratings = filterRatingsByMenu(ratings, data);
+      .then((day) => {
+        const data = day.menus;
+        // Food ratings are filled in from the items as they render
+        ratings = { foods: {}, ...day.ratings };
 
         const menusContainer = document.getElementById("menus-container");
         menusContainer.innerHTML = ""; // Clear previous menus
@@ -505,6 +383,9 @@ document.addEventListener("DOMContentLoaded", function () {
                   communityRow.appendChild(communityLabel);
 
                   const foodRatingKey = `${item.name}_${station}_${diningHall}_${item.meal}`;
+                  if (item.rating) {
+                    ratings.foods[foodRatingKey] = item.rating;
+                  }
                   const communityObj = ratings.foods[foodRatingKey] || {
                     avg_rating: 0,
                     rating_count: 0,
@@ -820,7 +701,7 @@ document.addEventListener("DOMContentLoaded", function () {
         `Meal Title: ${mealTitle ? mealTitle.textContent : "null"}, Original Meal: ${mealSlug}`,
       );
 
-      // Map to original meal slug (same logic as in filterRatingsByMenu)
+      // Map to original meal slug (the slugs menu items carry in item.meal)
       let originalMealSlug = mealSlug;
       if (diningHall === "Catlett") {
         if (mealSlug === "breakfast") originalMealSlug = "breakfast-2";
@@ -1067,26 +948,76 @@ document.addEventListener("DOMContentLoaded", function () {
     // Just do nothing to avoid errors
   }
 
-  // Load ratings first, then menus to ensure ratings are available
-  fetchRatings()
-    .then(() => {
-      fetchMenus(dateInput.value);
-    })
-    .catch((error) => {
-      console.error("Error loading initial data:", error);
+  let liveUpdates = null;
+
+  function applyLiveRatings(changes) {
+    for (const change of changes) {
+      const items = document.querySelectorAll(
+        `li[data-food-id="${change.food_id}"]`,
+      );
+      items.forEach((li) => {
+        const foodName = li.querySelector(".food-item-name").textContent;
+        const station = li.closest(".station").querySelector("h4")
+          .dataset.originalName;
+        const diningHall = li.closest(".dining-hall").querySelector("h2")
+          .dataset.originalName;
+        const foodKey = `${foodName}_${station}_${diningHall}_${li.dataset.mealSlug}`;
+        if (change.rating_count > 0) {
+          ratings.foods[foodKey] = {
+            avg_rating: change.avg_rating,
+            rating_count: change.rating_count,
+            dist: change.dist,
+          };
+        } else {
+          delete ratings.foods[foodKey];
+        }
+        updateCommunityRatingDisplay(li);
+        updateLiveAggregates(li);
+      });
+    }
+  }
+
+  function connectLiveUpdates(date) {
+    if (liveUpdates) {
+      liveUpdates.close();
+      liveUpdates = null;
+    }
+    if (!window.EventSource) return;
+    // Other users' ratings for this date, pushed as they are saved. The
+    // browser reconnects by itself and the server replays missed changes.
+    liveUpdates = new EventSource(`/api/stream?date=${date}`);
+    liveUpdates.addEventListener("ratings", (event) => {
+      try {
+        applyLiveRatings(JSON.parse(event.data));
+      } catch (e) {
+        console.warn("Failed to apply live ratings:", e);
+      }
+    });
+    liveUpdates.addEventListener("resync", () => {
+      // We fell too far behind; reload the day but keep open sections open
+      const openTabs = new Set(
+        Array.from(
+          document.querySelectorAll("#menus-container .active[id]"),
+          (el) => el.id,
+        ),
+      );
+      fetchDay(date, openTabs);
     });
+    liveUpdates.onerror = () => {
+      // Live updates are disabled or the server is full; stop retrying
+      if (liveUpdates && liveUpdates.readyState === EventSource.CLOSED) {
+        liveUpdates = null;
+      }
+    };
+  }
+
+  fetchDay(dateInput.value);
+  connectLiveUpdates(dateInput.value);
 
   dateInput.addEventListener("change", function () {
     console.log("Date changed to:", this.value);
-    // Load ratings first, then menus
-    fetchRatings()
-      .then(() => {
-        console.log("Ratings fetched for new date:", ratings);
-        fetchMenus(this.value);
-      })
-      .catch((error) => {
-        console.error("Error loading data for date change:", error);
-      });
+    fetchDay(this.value);
+    connectLiveUpdates(this.value);
   });
 
   // Event delegation to handle all clicks without memory leaks
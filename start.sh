@@ -16,6 +16,10 @@ fi
 # Set required environment variables
 export ADMIN_TOKEN=${ADMIN_TOKEN:-"mega_gooner"}
 export RATE_LIMIT_STORAGE_URI=${RATE_LIMIT_STORAGE_URI:-"memory://"}
+# Workers share metric samples through this directory (see gunicorn.conf.py)
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-"/tmp/ratemyrations-metrics"}
+# Threads per worker; the app caps live update streams below this
+export GUNICORN_THREADS=${GUNICORN_THREADS:-32}
 
 echo "📋 Configuration:"
 echo "  - Admin Token: ${ADMIN_TOKEN}"
@@ -29,7 +33,12 @@ python3 ratemyrations/database.py
 
 # Start Gunicorn
 echo "⚙️  Starting Gunicorn server..."
-gunicorn -w 4 -b 0.0.0.0:8000 ratemyrations.wsgi:application &
+# Live update streams each hold a thread, so they need threaded workers
+if [ "${SSE_ENABLED}" = "true" ]; then
+    gunicorn -w 4 -k gthread --threads ${GUNICORN_THREADS} -b 0.0.0.0:8000 ratemyrations.wsgi:application &
+else
+    gunicorn -w 4 -b 0.0.0.0:8000 ratemyrations.wsgi:application &
+fi
 GUNICORN_PID=$!
 
 echo "✅ Gunicorn started (PID: $GUNICORN_PID)"